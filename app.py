@@ -5,6 +5,15 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import importlib
 import os
+from utils.downsample import downsample_frame
+from utils import plot_stats
+from utils import code_runner
+from utils import prewarm
+
+# Compile every topic module into the bytecode cache once per server process (background thread).
+code_runner.precompile_topics()
+# Load the default outputs of every topic (built by `python -m utils.prewarm`, else in the background).
+prewarm.default_bundle()
 
 # --- Custom CSS for professional look ---
 st.markdown(
@@ -90,45 +99,55 @@ if selected:
     st.markdown('<div class="section-header">Practice this topic:</div>', unsafe_allow_html=True)
     default_code = module_code
     user_code = st.text_area("Edit and run code below:", value=default_code, height=250, key=f"editor_{basics_dir}_{selected}")
+    vectorize = st.checkbox("⚡ Vectorize large numeric comprehensions/map/filter/reduce with NumPy", key=f"vectorize_{basics_dir}_{selected}")
+    keep_state = st.checkbox("🔁 Keep variables between runs (only new or changed code re-runs)", key=f"kernel_{basics_dir}_{selected}")
     run_btn = st.button(f"▶️ Run Your Code for {selected}")
+    if keep_state:
+        if "session_id" not in st.session_state:
+            import uuid
+            st.session_state.session_id = uuid.uuid4().hex
+        kernel_key = f"{st.session_state.session_id}/{basics_dir}/{selected}"
+        cell_mode = st.checkbox("🧩 Cell mode: re-run only edited cells and the cells that use their results (split at blank lines or # %%)", key=f"cells_{basics_dir}_{selected}")
+        if st.button("🔄 Restart kernel"):
+            code_runner.default_manager().restart(kernel_key)
+            st.info("Kernel restarted: all variables cleared.")
     if run_btn:
-        import io, contextlib
-        output = io.StringIO()
-        result = None
-        # Common imports for all modules
-        common_imports = """
-import sys
-import os
-import math
-import re
-import json
-import argparse
-import datetime
-from functools import reduce
-from contextlib import contextmanager
-"""
-        code_to_run = common_imports + "\n" + user_code
+        prewarmed = None
         try:
-            with contextlib.redirect_stdout(output):
-                # Use exec in a shared namespace for globals and locals
-                exec_namespace = {}
-                exec(code_to_run, exec_namespace, exec_namespace)
-            std_output = output.getvalue()
+            if keep_state:
+                kernel = code_runner.default_manager().get(kernel_key)
+                if cell_mode:
+                    result = kernel.run_cells(user_code, vectorize)
+                    st.caption(f"Ran {result.executed} cell(s), reused the output of {result.reused}, in {result.seconds:.2f}s")
+                else:
+                    result = kernel.run(user_code, vectorize)
+                    st.caption(f"Ran {result.executed} statement(s), reused {result.reused} from earlier runs, in {result.seconds:.2f}s")
+            else:
+                # Unedited topic code: serve the output stored at deploy time instead of running it.
+                bundle = prewarm.default_bundle()
+                prewarmed = bundle.lookup(user_code) if bundle is not None and not vectorize else None
+                result = prewarmed.result if prewarmed is not None else code_runner.default_runner().run(user_code, vectorize)
+            exec_namespace = result.namespace
+            if result.error is not None:
+                raise result.error
+            std_output = result.stdout
             st.markdown("<b>Standard Output:</b>", unsafe_allow_html=True)
             if std_output.strip():
                 st.code(std_output)
+                if result.output is not None and result.output.truncated:
+                    st.caption(f"Output was {result.output.total_chars:,} characters; showing only the beginning and the end.")
+                    st.download_button("⬇️ Download full output", result.output.full_output(), file_name=f"{selected}_output.txt",
+                                       mime="text/plain", on_click="ignore")
             else:
                 st.info("No output from print statements.")
-            # Only call user-defined functions (not built-ins or imported)
-            import types
-            user_funcs = [k for k, v in exec_namespace.items() if callable(v) and isinstance(v, types.FunctionType) and v.__module__ == '__main__']
-            if 'main' in user_funcs:
-                ret = exec_namespace['main']()
-                st.markdown("<b>main() Return Value:</b>", unsafe_allow_html=True)
-                st.success(ret)
-            elif user_funcs:
-                ret = exec_namespace[user_funcs[0]]()
-                st.markdown(f"<b>{user_funcs[0]}() Return Value:</b>", unsafe_allow_html=True)
+            if prewarmed is not None:
+                entry_point = prewarmed.entry_point
+            else:
+                # Only call user-defined functions (not built-ins or imported)
+                entry_point = code_runner.call_entry_point(exec_namespace)
+            if entry_point is not None:
+                func_name, ret = entry_point
+                st.markdown(f"<b>{func_name}() Return Value:</b>", unsafe_allow_html=True)
                 st.success(ret)
         except Exception as e:
             st.error(f"Error: {e}")
@@ -137,15 +156,16 @@ from contextlib import contextmanager
 st.markdown('<div class="footer">© 2025 Master Python for Data Science &nbsp;|&nbsp; Built with Streamlit</div>', unsafe_allow_html=True)
 
 # Example: DataFrame
-df = pd.DataFrame(np.random.randn(50, 3), columns=['A', 'B', 'C'])
+# Seeded, so reruns produce the same frame and the plot_stats cache below hits.
+df = pd.DataFrame(np.random.default_rng(0).standard_normal((50, 3)), columns=['A', 'B', 'C'])
 st.write("Random DataFrame:", df)
 
-# Example: Chart
-st.line_chart(df)
+# Example: Chart (downsampled, so large frames stay fast to send and draw)
+st.line_chart(downsample_frame(df))
 
-# Example: Seaborn plot
+# Example: Seaborn-style plot (histogram and KDE computed once per dataset, then cached)
 fig, ax = plt.subplots()
-sns.histplot(data=df, x='A', kde=True, ax=ax)
+plot_stats.histplot(df, x='A', kde=True, ax=ax)
 st.pyplot(fig)
 
 # Example: User code execution (safe for simple code)
@@ -109,10 +109,15 @@ def read_csv(filename: str = 'data.csv') -> list[dict[str, str]]:
         reader = csv.DictReader(f)
         return list(reader)
 
-def read_csv_pandas(filename: str = 'data.csv') -> pd.DataFrame:
+def read_csv_pandas(filename: str = 'data.csv', optimize: bool = False, schema_path: str | None = None) -> pd.DataFrame:
     """
     Read a CSV file into a pandas DataFrame (preferred for data science).
+    optimize=True shrinks memory: downcast numbers, categoricals for low-cardinality strings.
+    With schema_path, the optimized dtypes are saved once and reused to skip inference next time.
     """
+    if optimize:
+        from utils.dtype_optimizer import read_csv_optimized
+        return read_csv_optimized(filename, schema_path=schema_path, report=True)
     return pd.read_csv(filename)
 
 def write_json(data: dict[str, Any], filename: str = 'data.json') -> None:
@@ -0,0 +1,425 @@
+"""
+broker.py
+---------
+Multi-node code execution: a TCP broker, worker nodes and a client runner.
+
+    python -m utils.broker broker --port 8700
+    python -m utils.broker node --broker 127.0.0.1:8700 --capacity 4   # on each worker host
+    CODE_RUNNER=broker CODE_RUNNER_BROKER=127.0.0.1:8700 streamlit run app.py
+
+Nodes register with the broker and announce a capacity (concurrent runs).
+Clients (BrokerRunner, selected through code_runner.default_runner) submit
+jobs over one persistent connection and get results back on it.
+
+- Dispatch: a new job goes to the local queue of the least-loaded node and
+  is sent as soon as that node has a free slot.
+- Work stealing: a node with a free slot and nothing queued takes from the
+  global queue, then from the back of the longest other node's queue.
+- Heartbeats: nodes send one every heartbeat_interval seconds; a node that
+  is silent for heartbeat_timeout, or whose connection drops, is removed
+  and its queued and running jobs are re-queued at the front (a job is
+  failed after max_attempts lost nodes, e.g. code that kills its node).
+
+Messages are newline-delimited JSON, so everything runs as local processes
+for testing, with no outside service.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from utils import code_runner
+from utils.code_runner import RunResult
+from utils.http_api import result_to_json
+from utils.output_capture import BoundedOutput
+
+
+def parse_address(address: str | tuple[str, int]) -> tuple[str, int]:
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class _Conn:
+    """Newline-delimited JSON over a socket; send() is thread-safe."""
+    def __init__(self, sock: socket.socket) -> None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self._reader = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+
+    def send(self, message: dict[str, Any]) -> None:
+        data = json.dumps(message).encode() + b"\n"
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for line in self._reader:
+            yield json.loads(line)
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RemoteError(Exception):
+    """An exception raised by code on a worker node; str() is its message, .type its class name."""
+    def __init__(self, type_name: str, message: str) -> None:
+        super().__init__(message)
+        self.type = type_name
+
+
+def result_from_json(data: dict[str, Any]) -> RunResult:
+    output = BoundedOutput()
+    output.write(data.get("full_output") or data["stdout"])
+    output.total_chars = data["total_chars"]
+    error = data["error"]
+    return RunResult(output.getvalue(), error and RemoteError(error["type"], error["message"]), {},
+                     data["executed"], 0, data["seconds"], output)
+
+
+# =========================
+# BROKER
+# =========================
+@dataclass
+class _Job:
+    client_id: str      # the id the client chose; only meaningful on its own connection
+    code: str
+    vectorize: bool
+    client: _Conn
+    attempts: int = 0
+    # Nodes only ever see this broker-assigned id, so ids from different clients cannot collide.
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+@dataclass
+class _Node:
+    id: str
+    conn: _Conn
+    capacity: int
+    free: int
+    last_seen: float = field(default_factory=time.monotonic)
+    queued: deque[_Job] = field(default_factory=deque)
+    running: dict[str, _Job] = field(default_factory=dict)
+
+    @property
+    def load(self) -> float:
+        return (len(self.running) + len(self.queued)) / self.capacity
+
+
+class Broker:
+    """Accepts nodes and clients on one TCP port. start() serves in background threads."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 8700, heartbeat_timeout: float = 10.0,
+                 max_attempts: int = 3) -> None:
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._queue: deque[_Job] = deque()
+        self._nodes: dict[str, _Node] = {}
+        self._stopped = threading.Event()
+        self.counters = {"submitted": 0, "completed": 0, "stolen": 0, "requeued": 0, "failed": 0, "nodes_lost": 0}
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                broker._serve_connection(_Conn(self.request))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+
+    def start(self) -> Broker:
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="broker").start()
+        threading.Thread(target=self._reap, daemon=True, name="broker-reaper").start()
+        return self
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            nodes = list(self._nodes.values())
+        for node in nodes:
+            node.conn.close()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            nodes = {n.id: {"capacity": n.capacity, "running": len(n.running), "queued": len(n.queued)}
+                     for n in self._nodes.values()}
+            return {**self.counters, "queued": len(self._queue), "nodes": nodes}
+
+    # --- connections ---
+    def _serve_connection(self, conn: _Conn) -> None:
+        node_id = None
+        try:
+            for message in conn:
+                kind = message["type"]
+                if kind == "register":
+                    node_id = message["node"]
+                    with self._lock:
+                        self._nodes[node_id] = _Node(node_id, conn, message["capacity"], message["capacity"])
+                    self._dispatch()
+                elif kind == "heartbeat" and node_id is not None:
+                    with self._lock:
+                        if node_id in self._nodes:
+                            self._nodes[node_id].last_seen = time.monotonic()
+                elif kind == "result" and node_id is not None:
+                    self._complete(node_id, message)
+                elif kind == "submit":
+                    self._submit(_Job(message["id"], message["code"], bool(message.get("vectorize")), conn))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if node_id is not None:
+                self._lose_node(node_id)
+
+    def _submit(self, job: _Job) -> None:
+        with self._lock:
+            self.counters["submitted"] += 1
+            if self._nodes:
+                min(self._nodes.values(), key=lambda n: n.load).queued.append(job)
+            else:
+                self._queue.append(job)
+        self._dispatch()
+
+    def _complete(self, node_id: str, message: dict[str, Any]) -> None:
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                return
+            node.last_seen = time.monotonic()
+            job = node.running.pop(message["id"], None)
+            if job is None:
+                return  # not a job this node is running (e.g. already re-queued); its slot was never counted
+            node.free += 1
+            self.counters["completed"] += 1
+        self._reply(job, message["result"])
+        self._dispatch()
+
+    def _reply(self, job: _Job, result: dict[str, Any]) -> None:
+        try:
+            job.client.send({"type": "result", "id": job.client_id, "result": result})
+        except OSError:
+            pass  # the client went away; nobody is waiting for this result
+
+    def _next_job(self, node: _Node) -> _Job | None:
+        if node.queued:
+            return node.queued.popleft()
+        if self._queue:
+            return self._queue.popleft()
+        victim = max((n for n in self._nodes.values() if n is not node), key=lambda n: len(n.queued), default=None)
+        if victim is not None and victim.queued:
+            self.counters["stolen"] += 1
+            return victim.queued.pop()
+        return None
+
+    def _dispatch(self) -> None:
+        """Send jobs to every node with free slots. Sends happen outside the lock."""
+        sends = []
+        with self._lock:
+            for node in self._nodes.values():
+                while node.free > 0:
+                    job = self._next_job(node)
+                    if job is None:
+                        break
+                    node.free -= 1
+                    node.running[job.id] = job
+                    sends.append((node, job))
+        for node, job in sends:
+            try:
+                node.conn.send({"type": "job", "id": job.id, "code": job.code, "vectorize": job.vectorize})
+            except OSError:
+                self._lose_node(node.id)
+
+    def _lose_node(self, node_id: str) -> None:
+        failed = []
+        with self._lock:
+            node = self._nodes.pop(node_id, None)
+            if node is None:
+                return
+            self.counters["nodes_lost"] += 1
+            # Running jobs may have been what killed the node; they count an attempt. Queued ones were never started.
+            for job in node.running.values():
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    failed.append(job)
+                else:
+                    self.counters["requeued"] += 1
+                    self._queue.appendleft(job)
+            self._queue.extendleft(reversed(node.queued))
+            self.counters["failed"] += len(failed)
+        node.conn.close()
+        for job in failed:
+            self._reply(job, {"stdout": "", "total_chars": 0, "executed": 0, "seconds": 0.0, "truncated": False,
+                              "error": {"type": "RuntimeError", "message": f"worker node lost {job.attempts} times while running this code"}})
+        self._dispatch()
+
+    def _reap(self) -> None:
+        while not self._stopped.wait(self.heartbeat_timeout / 4):
+            cutoff = time.monotonic() - self.heartbeat_timeout
+            with self._lock:
+                silent = [n.id for n in self._nodes.values() if n.last_seen < cutoff]
+            for node_id in silent:
+                self._lose_node(node_id)
+
+
+# =========================
+# WORKER NODE
+# =========================
+class WorkerNode:
+    """Connects to a broker and runs up to capacity jobs at a time with runner."""
+    def __init__(self, broker: str | tuple[str, int], capacity: int = 1, runner: Any = None,
+                 heartbeat_interval: float = 2.0, node_id: str | None = None) -> None:
+        self.broker = parse_address(broker)
+        self.capacity = capacity
+        self.runner = runner or code_runner.InlineRunner()
+        self.heartbeat_interval = heartbeat_interval
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.completed = 0
+        self._conn: _Conn | None = None
+        self._stopped = threading.Event()
+
+    def serve_forever(self) -> None:
+        """Run until the broker closes the connection or stop() is called."""
+        self._conn = conn = _Conn(socket.create_connection(self.broker))
+        conn.send({"type": "register", "node": self.node_id, "capacity": self.capacity})
+        threading.Thread(target=self._heartbeat, args=(conn,), daemon=True, name="node-heartbeat").start()
+        with ThreadPoolExecutor(self.capacity, thread_name_prefix="node-run") as executor:
+            try:
+                for message in conn:
+                    if message["type"] == "job":
+                        executor.submit(self._run, conn, message)
+            except (OSError, ValueError):
+                pass
+            finally:
+                self._stopped.set()
+
+    def _run(self, conn: _Conn, job: dict[str, Any]) -> None:
+        result = self.runner.run(job["code"], job["vectorize"])
+        try:
+            conn.send({"type": "result", "id": job["id"], "result": result_to_json(result, full_output=True)})
+            self.completed += 1
+        except OSError:
+            pass
+        finally:
+            if result.output is not None:
+                result.output.close()
+
+    def _heartbeat(self, conn: _Conn) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                conn.send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._conn is not None:
+            self._conn.close()
+
+
+# =========================
+# CLIENT
+# =========================
+class BrokerRunner:
+    """Runner that sends runs to a broker; same run() interface as code_runner.InlineRunner."""
+    def __init__(self, broker: str | tuple[str, int], timeout: float | None = 120.0) -> None:
+        self.broker = parse_address(broker)
+        self.timeout = timeout
+        self._conn: _Conn | None = None
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> _Conn:
+        if self._conn is None:
+            self._conn = _Conn(socket.create_connection(self.broker))
+            threading.Thread(target=self._read, args=(self._conn,), daemon=True, name="broker-client").start()
+        return self._conn
+
+    def _read(self, conn: _Conn) -> None:
+        try:
+            for message in conn:
+                with self._lock:
+                    future = self._pending.pop(message["id"], None)
+                if future is not None:
+                    future.set_result(message["result"])
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError("lost the connection to the broker"))
+
+    def run(self, code: str, vectorize: bool = False) -> RunResult:
+        job_id = uuid.uuid4().hex
+        future: Future = Future()
+        try:
+            with self._lock:
+                conn = self._connection()
+                self._pending[job_id] = future
+            conn.send({"type": "submit", "id": job_id, "code": code, "vectorize": vectorize})
+            return result_from_json(future.result(self.timeout))
+        except FutureTimeout:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            return RunResult("", TimeoutError(f"No result from the broker within {self.timeout:g}s"), {})
+        except (OSError, ConnectionError) as e:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            return RunResult("", ConnectionError(f"Broker unavailable: {e}"), {})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-node code execution")
+    sub = parser.add_subparsers(dest="role", required=True)
+    broker_args = sub.add_parser("broker", help="run the broker")
+    broker_args.add_argument("--host", default="127.0.0.1")
+    broker_args.add_argument("--port", type=int, default=8700)
+    broker_args.add_argument("--heartbeat-timeout", type=float, default=10.0)
+    node_args = sub.add_parser("node", help="run a worker node")
+    node_args.add_argument("--broker", default="127.0.0.1:8700")
+    node_args.add_argument("--capacity", type=int, default=os.cpu_count() or 1)
+    node_args.add_argument("--runner", choices=["pool", "inline"], default="pool",
+                           help="pool: supervised worker processes (survives crashing code); inline: in this process")
+    args = parser.parse_args()
+
+    if args.role == "broker":
+        server = Broker(args.host, args.port, args.heartbeat_timeout).start()
+        print(f"broker listening on {server.address[0]}:{server.address[1]}")
+        try:
+            while True:
+                time.sleep(30)
+                print(json.dumps(server.stats()))
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        if args.runner == "pool":
+            from utils.worker_pool import WorkerPool
+            runner: Any = WorkerPool(size=args.capacity)
+        else:
+            runner = code_runner.InlineRunner()
+        node = WorkerNode(args.broker, args.capacity, runner)
+        print(f"node {node.node_id} serving {args.broker} with capacity {args.capacity}")
+        try:
+            node.serve_forever()
+        except KeyboardInterrupt:
+            node.stop()
@@ -0,0 +1,126 @@
+"""
+bytecode_cache.py
+-----------------
+Cache compiled code objects so unchanged code is never parsed or compiled twice.
+
+Entries are keyed by a hash of the source, filename and compile mode (plus
+the interpreter's bytecode magic number), kept in a memory LRU and on disk
+as marshal files. The disk level is shared by every process using the same
+directory, so a statement compiled by one code-runner worker is a disk hit
+in the others, and survives restarts.
+
+    code = default_cache().compile(source, "<user_code>")
+    exec(code, namespace)
+
+precompile_topics() fills the cache with the statements of every topic
+module (basics/, data_science/, core_python/), so even the first run of a
+lesson skips compilation.
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import marshal
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from types import CodeType
+from typing import Iterable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, ".cache", "bytecode")
+TOPIC_DIRS = ("basics", "data_science", "core_python")
+
+
+def source_key(source: str, filename: str = "<user_code>", mode: str = "exec") -> str:
+    # b"2": entries are compiled with dont_inherit=True (earlier ones inherited PEP 563).
+    digest = hashlib.blake2b(importlib.util.MAGIC_NUMBER + b"2", digest_size=16)
+    for part in (filename, mode, source):
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class BytecodeCache:
+    """
+    Two-level (memory LRU + marshal files) cache of code objects.
+    Call compile() instead of the builtin; a hit skips parsing and compiling.
+    """
+    def __init__(self, cache_dir: str | None = None, max_in_memory: int = 512) -> None:
+        self.cache_dir = cache_dir or os.environ.get("BYTECODE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_in_memory = max_in_memory
+        self._memory: OrderedDict[str, CodeType] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.marshal")
+
+    def _remember(self, key: str, code: CodeType) -> None:
+        with self._lock:
+            self._memory[key] = code
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_in_memory:
+                self._memory.popitem(last=False)
+
+    def compile(self, source: str, filename: str = "<user_code>", mode: str = "exec") -> CodeType:
+        """Same as compile(source, filename, mode), cached. Syntax errors are raised, not cached."""
+        key = source_key(source, filename, mode)
+        with self._lock:
+            code = self._memory.get(key)
+            if code is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return code
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                code = marshal.load(f)
+            self.stats["disk_hits"] += 1
+        except (OSError, EOFError, ValueError, TypeError):
+            # Missing, or truncated by a crashed writer: recompile.
+            code = None
+        if code is None:
+            self.stats["misses"] += 1
+            # dont_inherit: this module's `from __future__ import annotations` must not
+            # turn learners' annotations into strings.
+            code = compile(source, filename, mode, dont_inherit=True)
+            self._write(path, code)
+        self._remember(key, code)
+        return code
+
+    def _write(self, path: str, code: CodeType) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                marshal.dump(code, f)
+            os.replace(tmp, path)  # atomic: concurrent readers see the old file or the complete new one
+        except OSError:
+            pass  # read-only or full disk: the memory level still works
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+_default_cache: BytecodeCache | None = None
+
+
+def default_cache() -> BytecodeCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = BytecodeCache()
+    return _default_cache
+
+
+def topic_files(dirs: Iterable[str] = TOPIC_DIRS) -> list[str]:
+    paths = []
+    for directory in dirs:
+        directory = os.path.join(ROOT, directory)
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                         if f.endswith(".py") and not f.startswith("__"))
+    return paths
@@ -0,0 +1,259 @@
+"""
+caching.py
+----------
+Memoization decorator with eviction policies, TTLs, byte limits and an
+optional cross-process backend.
+
+functools.lru_cache only bounds the number of entries, needs hashable
+arguments and lives in one process. memoize adds:
+- LRU or LFU eviction, bounded by entries (maxsize) and/or bytes (max_bytes)
+- ttl: entries expire after ttl seconds
+- content-hashed keys, so numpy arrays and DataFrames work as arguments
+- stats: hits, misses, evictions, expirations
+- SQLiteBackend: a local SQLite file shared by every worker process of the
+  code runner (values are pickled)
+
+    @memoize(max_bytes=64 * 2**20, ttl=600)
+    def load_table(path): ...
+
+    @memoize(backend=SQLiteBackend(".cache/grading.sqlite"))
+    def grade(submission): ...
+
+    load_table.cache_stats()
+"""
+from __future__ import annotations
+
+import functools
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from utils.fingerprint import fingerprint
+
+_MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate bytes held by value (exact for arrays and frames)."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires: float | None
+    uses: int = 0
+
+
+class MemoryBackend:
+    """In-process store with LRU/LFU eviction; one per decorated function by default."""
+    def __init__(self, maxsize: int | None = 128, max_bytes: int | None = None, ttl: float | None = None,
+                 policy: str = "lru") -> None:
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be 'lru' or 'lfu'")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return _MISSING
+            if entry.expires is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return _MISSING
+            entry.uses += 1
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry.value
+
+    def set(self, key: str, value: Any) -> None:
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything and still not fit
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, expires)
+            self.stats.entries += 1
+            self.stats.bytes += size
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.stats.entries -= 1
+        self.stats.bytes -= entry.size
+
+    def _over_limit(self) -> bool:
+        return ((self.maxsize is not None and len(self._entries) > self.maxsize)
+                or (self.max_bytes is not None and self.stats.bytes > self.max_bytes))
+
+    def _evict(self) -> None:
+        while self._over_limit():
+            if self.policy == "lru":
+                key = next(iter(self._entries))
+            else:
+                # Least used; ties go to the least recently used (earliest in the OrderedDict).
+                key = min(self._entries, key=lambda k: self._entries[k].uses)
+            self._remove(key)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats.entries = self.stats.bytes = 0
+
+
+class SQLiteBackend:
+    """
+    Store shared by every process that opens the same file (WAL mode, so readers never block).
+    Values must be picklable. Hit/miss counters are per process; entries and bytes are global.
+    """
+    def __init__(self, path: str, maxsize: int | None = 10_000, max_bytes: int | None = 256 * 2**20,
+                 ttl: float | None = None, policy: str = "lru") -> None:
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be 'lru' or 'lfu'")
+        self.path = path
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self.stats = CacheStats()
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, last_used REAL, uses INTEGER)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads or forks; keep one per thread and pid.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Any:
+        db = self._connect()
+        row = db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return _MISSING
+        value, expires = row
+        if expires is not None and expires < time.time():
+            with db:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return _MISSING
+        with db:
+            db.execute("UPDATE entries SET last_used = ?, uses = uses + 1 WHERE key = ?", (time.time(), key))
+        self.stats.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes is not None and len(blob) > self.max_bytes:
+            return
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        db = self._connect()
+        with db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0)", (key, blob, len(blob), expires, time.time()))
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        order = "last_used" if self.policy == "lru" else "uses, last_used"
+        db.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while (self.maxsize is not None and count > self.maxsize) or (self.max_bytes is not None and total > self.max_bytes):
+            row = db.execute(f"SELECT key, size FROM entries ORDER BY {order} LIMIT 1").fetchone()
+            if row is None:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            count, total = count - 1, total - row[1]
+            self.stats.evictions += 1
+        self.stats.entries, self.stats.bytes = count, total
+
+    def clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM entries")
+        self.stats.entries = self.stats.bytes = 0
+
+
+def memoize(
+    maxsize: int | None = 128,
+    max_bytes: int | None = None,
+    ttl: float | None = None,
+    policy: str = "lru",
+    backend: MemoryBackend | SQLiteBackend | None = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Cache results keyed by the content of the arguments.
+    With backend=None each decorated function gets its own MemoryBackend(maxsize, max_bytes, ttl, policy).
+    Adds .cache_stats(), .cache_clear() and .cache_backend to the wrapped function.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        store = backend or MemoryBackend(maxsize, max_bytes, ttl, policy)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = fingerprint(name, args, kwargs)
+            value = store.get(key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                store.set(key, value)
+            return value
+
+        wrapper.cache_stats = lambda: store.stats
+        wrapper.cache_clear = store.clear
+        wrapper.cache_backend = store
+        return wrapper
+    return decorator
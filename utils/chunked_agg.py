@@ -0,0 +1,365 @@
+"""
+chunked_agg.py
+--------------
+Out-of-core group-by/aggregate over CSV (or columnar) files larger than RAM.
+
+The pandas_intro pattern df.groupby(by).agg(spec) needs the whole frame in
+memory. GroupAggregator instead folds chunks into mergeable partial
+aggregates, so memory depends on the number of groups, not the number of rows:
+- sum, count, min, max, mean: exact (mean is carried as sum and count)
+- median and percentiles ("p90", "p99"): QuantileSketch (a merging t-digest)
+- nunique: DistinctSketch (HyperLogLog)
+Both sketches stay exact while a group is small, so results match pandas on
+small inputs. Partials from worker processes merge with GroupAggregator.merge.
+
+    aggregate_csv("sales.csv", by="region", aggs={"amount": ["sum", "mean", "p90"], "customer": ["nunique"]})
+"""
+from __future__ import annotations
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+SIMPLE = ("sum", "count", "min", "max")
+# Statistics that must be collected for each requested aggregation.
+NEEDS = {"sum": ("sum",), "count": ("count",), "min": ("min",), "max": ("max",), "mean": ("sum", "count")}
+
+
+def _quantile_of(name: str) -> float | None:
+    """'median' -> 0.5, 'p90' -> 0.9, anything else -> None."""
+    if name == "median":
+        return 0.5
+    if name.startswith("p") and name[1:].replace(".", "", 1).isdigit():
+        return float(name[1:]) / 100
+    return None
+
+
+# =========================
+# SKETCHES
+# =========================
+class QuantileSketch:
+    """
+    Mergeable quantile estimator: exact up to max_exact values, then a t-digest
+    with about `compression` centroids (accurate to a fraction of a percent, best at the tails).
+    """
+    def __init__(self, compression: int = 200, max_exact: int = 10_000) -> None:
+        self.compression = compression
+        self.max_exact = max_exact
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.exact = True
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._add(values, np.ones(len(values)), exact=True)
+
+    def merge(self, other: QuantileSketch) -> None:
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._add(other.means, other.weights, exact=other.exact)
+
+    def _add(self, means: np.ndarray, weights: np.ndarray, exact: bool) -> None:
+        self.means = np.concatenate([self.means, means])
+        self.weights = np.concatenate([self.weights, weights])
+        self.exact = self.exact and exact and len(self.means) <= self.max_exact
+        if not self.exact and len(self.means) > 2 * self.compression:
+            self._compress()
+
+    def _compress(self) -> None:
+        order = np.argsort(self.means, kind="stable")
+        means, weights = self.means[order], self.weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        # k1 scale function: centroids are small near q=0 and q=1 and large in the middle.
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+        _, bucket = np.unique(bucket, return_inverse=True)
+        new_weights = np.bincount(bucket, weights=weights)
+        self.means = np.bincount(bucket, weights=means * weights) / new_weights
+        self.weights = new_weights
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def quantile(self, q: float) -> float:
+        if not len(self.means):
+            return np.nan
+        if self.exact:
+            # Same linear interpolation as pandas/numpy.
+            return float(np.quantile(self.means, q))
+        order = np.argsort(self.means)
+        means, weights = self.means[order], self.weights[order]
+        centers = np.cumsum(weights) - weights / 2
+        positions = np.concatenate([[0], centers, [weights.sum()]])
+        values = np.concatenate([[self.min], means, [self.max]])
+        return float(np.interp(q * weights.sum(), positions, values))
+
+
+def _value_hashes(series: pd.Series) -> np.ndarray:
+    """
+    64-bit hashes where equal numbers hash equally whatever the dtype: a column that is
+    int64 in one chunk and float64 (because of a NaN) in the next must not double count.
+    Integral values hash as int64, all other numbers as float64.
+    """
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return pd.util.hash_array(series.to_numpy())
+    if pd.api.types.is_integer_dtype(series):
+        return pd.util.hash_array(series.to_numpy(dtype=np.int64))
+    values = series.to_numpy(dtype=np.float64)
+    integral = (values == np.floor(values)) & (np.abs(values) < 2.0**63)
+    hashes = np.empty(len(values), dtype=np.uint64)
+    hashes[integral] = pd.util.hash_array(values[integral].astype(np.int64))
+    hashes[~integral] = pd.util.hash_array(values[~integral])
+    return hashes
+
+
+class DistinctSketch:
+    """
+    Mergeable distinct counter: an exact hash set up to max_exact values,
+    then HyperLogLog with 2**precision registers (about 1% error at precision 14).
+    """
+    def __init__(self, precision: int = 14, max_exact: int = 10_000) -> None:
+        self.precision = precision
+        self.max_exact = max_exact
+        self.hashes: set[int] | None = set()
+        self.registers: np.ndarray | None = None
+
+    def update(self, values: Any) -> None:
+        series = pd.Series(values).dropna()
+        if series.empty:
+            return
+        self._add_hashes(_value_hashes(series))
+
+    def _add_hashes(self, hashes: np.ndarray) -> None:
+        if self.hashes is not None:
+            self.hashes.update(np.unique(hashes).tolist())
+            if len(self.hashes) <= self.max_exact:
+                return
+            hashes, self.hashes = np.fromiter(self.hashes, dtype=np.uint64), None
+            self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64-p bits.
+        bit_length = np.where(rest > 0, np.frexp(rest.astype(float))[1], 0)
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: DistinctSketch) -> None:
+        if other.hashes is not None:
+            self._add_hashes(np.fromiter(other.hashes, dtype=np.uint64, count=len(other.hashes)))
+            return
+        if self.hashes is not None:
+            mine = np.fromiter(self.hashes, dtype=np.uint64, count=len(self.hashes))
+            self.hashes, self.registers = None, other.registers.copy()
+            self._add_hashes(mine)
+        else:
+            np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        if self.hashes is not None:
+            return len(self.hashes)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))  # linear counting for small cardinalities
+        return int(round(raw))
+
+
+# =========================
+# AGGREGATOR
+# =========================
+class GroupAggregator:
+    """
+    Streaming equivalent of df.groupby(by).agg(aggs).
+    Call update() with each chunk (or merge() partials from other processes), then result().
+    """
+    def __init__(self, by: str | list[str], aggs: dict[str, list[str]]) -> None:
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.aggs = {col: list(names) for col, names in aggs.items()}
+        self.simple_spec: dict[str, list[str]] = {}
+        self.sketch_specs: list[tuple[str, str]] = []
+        for col, names in self.aggs.items():
+            for name in names:
+                if name in NEEDS:
+                    stats = self.simple_spec.setdefault(col, [])
+                    stats.extend(s for s in NEEDS[name] if s not in stats)
+                elif name == "nunique" or _quantile_of(name) is not None:
+                    kind = "distinct" if name == "nunique" else "quantile"
+                    if (col, kind) not in self.sketch_specs:
+                        self.sketch_specs.append((col, kind))
+                else:
+                    raise ValueError(f"Unsupported aggregation {name!r} for column {col!r}")
+        self.partial: pd.DataFrame | None = None
+        self.sketches: dict[tuple[str, str], dict[Any, Any]] = {spec: {} for spec in self.sketch_specs}
+        self.rows = 0
+
+    def _combine(self, frames: list[pd.DataFrame]) -> pd.DataFrame:
+        stacked = pd.concat(frames)
+        merge_fns = {key: ("sum" if key[1] in ("sum", "count") else key[1]) for key in stacked.columns}
+        return stacked.groupby(level=list(range(len(self.by)))).agg(merge_fns)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk into the partial aggregates."""
+        self.rows += len(chunk)
+        grouped = chunk.groupby(self.by, sort=False, dropna=True, observed=True)
+        if self.simple_spec:
+            partial = grouped.agg(self.simple_spec)
+            self.partial = partial if self.partial is None else self._combine([self.partial, partial])
+        if self.sketch_specs:
+            indices = grouped.indices
+            for (col, kind), groups in self.sketches.items():
+                values = chunk[col].to_numpy()
+                for key, positions in indices.items():
+                    sketch = groups.get(key)
+                    if sketch is None:
+                        sketch = groups[key] = DistinctSketch() if kind == "distinct" else QuantileSketch()
+                    sketch.update(values[positions])
+
+    def merge(self, other: GroupAggregator) -> None:
+        """Combine the partial aggregates of another aggregator (e.g. from a worker process)."""
+        self.rows += other.rows
+        if other.partial is not None:
+            self.partial = other.partial if self.partial is None else self._combine([self.partial, other.partial])
+        for spec, groups in other.sketches.items():
+            mine = self.sketches[spec]
+            for key, sketch in groups.items():
+                if key in mine:
+                    mine[key].merge(sketch)
+                else:
+                    mine[key] = sketch
+
+    def result(self) -> pd.DataFrame:
+        """Final table with (column, aggregation) columns, sorted by the group keys like pandas."""
+        if self.partial is None and not any(self.sketches.values()):
+            # No chunks (or only empty ones): an empty table of the right shape, as pandas gives.
+            index = (pd.MultiIndex.from_arrays([[]] * len(self.by), names=self.by) if len(self.by) > 1
+                     else pd.Index([], name=self.by[0]))
+            return pd.DataFrame(index=index, columns=pd.MultiIndex.from_tuples(
+                [(col, name) for col, names in self.aggs.items() for name in names]))
+        columns: dict[tuple[str, str], pd.Series] = {}
+        for col, names in self.aggs.items():
+            for name in names:
+                if name in SIMPLE:
+                    columns[(col, name)] = self.partial[(col, name)]
+                elif name == "mean":
+                    count = self.partial[(col, "count")]
+                    columns[(col, name)] = self.partial[(col, "sum")] / count.where(count > 0)
+                elif name == "nunique":
+                    groups = self.sketches[(col, "distinct")]
+                    columns[(col, name)] = pd.Series({k: s.estimate() for k, s in groups.items()}, dtype="int64")
+                else:
+                    q = _quantile_of(name)
+                    groups = self.sketches[(col, "quantile")]
+                    columns[(col, name)] = pd.Series({k: s.quantile(q) for k, s in groups.items()}, dtype=float)
+        table = pd.DataFrame(columns).sort_index()
+        table.columns = pd.MultiIndex.from_tuples(list(columns))
+        table.index.names = self.by
+        return table
+
+
+# =========================
+# CHUNK SOURCES
+# =========================
+def csv_byte_ranges(path: str, block_bytes: int) -> list[tuple[int, int]]:
+    """Split a CSV file (after its header line) into byte ranges of about block_bytes."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+    return [(offset, min(offset + block_bytes, size)) for offset in range(start, size, block_bytes)] or [(start, start)]
+
+
+def read_csv_range(path: str, start: int, end: int, **read_csv_kwargs: Any) -> pd.DataFrame:
+    """
+    Rows whose first byte lies in [start, end). A row straddling a boundary belongs to the
+    range it starts in. Assumes no newlines inside quoted fields.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(start)
+        if start > len(header):
+            f.seek(start - 1)
+            f.readline()  # skip the partial row owned by the previous range
+        data_start = f.tell()
+        if data_start >= end:
+            body = b""
+        else:
+            body = f.read(end - data_start)
+            if not body.endswith(b"\n"):
+                body += f.readline()
+    return pd.read_csv(io.BytesIO(header + body), **read_csv_kwargs)
+
+
+def iter_parquet_batches(path: str, batch_size: int = 100_000, columns: list[str] | None = None) -> Iterator[pd.DataFrame]:
+    """Columnar chunks from a Parquet file (requires pyarrow)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("iter_parquet_batches requires pyarrow: pip install pyarrow") from e
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def aggregate_frames(chunks: Iterable[pd.DataFrame], by: str | list[str], aggs: dict[str, list[str]]) -> pd.DataFrame:
+    """Aggregate any stream of DataFrame chunks (e.g. pd.read_csv(..., chunksize=...))."""
+    aggregator = GroupAggregator(by, aggs)
+    for chunk in chunks:
+        aggregator.update(chunk)
+    return aggregator.result()
+
+
+def _aggregate_range(path: str, start: int, end: int, by: Any, aggs: dict[str, list[str]],
+                     read_csv_kwargs: dict[str, Any]) -> GroupAggregator:
+    aggregator = GroupAggregator(by, aggs)
+    aggregator.update(read_csv_range(path, start, end, **read_csv_kwargs))
+    return aggregator
+
+
+def aggregate_csv(
+    paths: str | list[str],
+    by: str | list[str],
+    aggs: dict[str, list[str]],
+    block_bytes: int = 32 * 2**20,
+    workers: int | None = 1,
+    **read_csv_kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Group-by/aggregate one or more CSV files in blocks of block_bytes.
+    workers > 1 parses and aggregates blocks in parallel processes; each worker
+    holds one block at a time and returns only its small partial aggregate.
+    """
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    tasks = [(path, start, end) for path in paths for start, end in csv_byte_ranges(path, block_bytes)]
+    total = GroupAggregator(by, aggs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for path, start, end in tasks:
+            total.merge(_aggregate_range(path, start, end, by, aggs, read_csv_kwargs))
+        return total.result()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of blocks in flight so partials never pile up.
+        pending: list[Any] = []
+        for path, start, end in tasks:
+            pending.append(pool.submit(_aggregate_range, path, start, end, by, aggs, read_csv_kwargs))
+            if len(pending) >= 2 * workers:
+                total.merge(pending.pop(0).result())
+        for future in pending:
+            total.merge(future.result())
+    return total.result()
@@ -0,0 +1,162 @@
+"""
+downsample.py
+-------------
+Shape-preserving downsampling for plotting large series.
+
+A screen is a couple of thousand pixels wide, so drawing a million points
+wastes render time (matplotlib) and transfer size (st.line_chart). These
+helpers pick a few thousand representative points first:
+- lttb: Largest-Triangle-Three-Buckets, keeps the visual shape of the line.
+- minmax: keeps the min and max of every bucket, so spikes never disappear.
+plot_downsampled re-queries the visible range when the user zooms or pans.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the min and max of y in n_out // 2 equal buckets, plus both endpoints.
+    NaNs are skipped; a bucket that is all NaN contributes no points.
+    """
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    missing = np.isnan(y)
+    # nanargmin/nanargmax raise on all-NaN buckets; with NaN as +/-inf they pick an index we drop below.
+    low, high = np.where(missing, np.inf, y), np.where(missing, -np.inf, y)
+    size = n // n_buckets
+    end = size * n_buckets
+    offsets = np.arange(n_buckets) * size
+    picks = [offsets + low[:end].reshape(n_buckets, size).argmin(axis=1),
+             offsets + high[:end].reshape(n_buckets, size).argmax(axis=1)]
+    if end < n:
+        picks.append([end + low[end:].argmin(), end + high[end:].argmax()])
+    body = np.concatenate(picks)
+    return np.unique(np.concatenate([body[~missing[body]], [0, n - 1]]))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices chosen by Largest-Triangle-Three-Buckets.
+    The bucket loop is inherently sequential; the work inside each bucket is vectorized.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:nxt_hi].mean() if nxt_hi > hi else x[-1]
+        avg_y = y[hi:nxt_hi].mean() if nxt_hi > hi else y[-1]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area (prev point, candidate, next bucket average).
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+
+def downsample(x: Any, y: Any, n_out: int = 2000, method: str = "lttb") -> tuple[np.ndarray, np.ndarray]:
+    """Return (x, y) reduced to about n_out points. x must be sorted."""
+    x, y = np.asarray(x), np.asarray(y)
+    if method == "lttb":
+        idx = lttb_indices(x, y, n_out)
+    elif method == "minmax":
+        idx = minmax_indices(y, n_out)
+    else:
+        raise ValueError(f"Unknown method: {method!r} (use 'lttb' or 'minmax')")
+    return x[idx], y[idx]
+
+
+def downsample_frame(df: pd.DataFrame, n_out: int = 1000, method: str = "minmax") -> pd.DataFrame:
+    """
+    Rows of df worth sending to st.line_chart: the union of the points each column keeps.
+    Frames with at most n_out rows are returned unchanged.
+    """
+    if len(df) <= n_out:
+        return df
+    numeric = df.select_dtypes("number")
+    per_column = max(n_out // max(len(numeric.columns), 1), 3)
+    if method == "lttb":
+        x = np.arange(len(df))
+        picks = [lttb_indices(x, numeric[c].to_numpy(dtype=float), per_column) for c in numeric]
+    else:
+        picks = [minmax_indices(numeric[c].to_numpy(dtype=float), per_column) for c in numeric]
+    return df.iloc[np.unique(np.concatenate(picks))] if picks else df.iloc[:n_out]
+
+
+class DownsampledLine:
+    """
+    A matplotlib line that keeps the full series and redraws only the visible range.
+    Created by plot_downsampled; the line artist keeps it alive, as long as the figure.
+    """
+    def __init__(self, ax: Any, x: Any, y: Any, n_out: int, method: str, **kwargs: Any) -> None:
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.n_out = n_out
+        self.method = method
+        (self.line,) = ax.plot(*downsample(self.x, self.y, n_out, method), **kwargs)
+        # Callback registries hold bound methods weakly: without this, a discarded
+        # DownsampledLine is collected and zooming stops re-querying.
+        self.line._downsampler = self
+        ax.callbacks.connect("xlim_changed", self._on_xlim)
+
+    def _on_xlim(self, ax: Any) -> None:
+        x0, x1 = ax.get_xlim()
+        lo = max(np.searchsorted(self.x, x0, side="left") - 1, 0)
+        hi = min(np.searchsorted(self.x, x1, side="right") + 1, len(self.x))
+        self.line.set_data(*downsample(self.x[lo:hi], self.y[lo:hi], self.n_out, self.method))
+        ax.figure.canvas.draw_idle()
+
+
+def plot_downsampled(ax: Any, x: Any, y: Any, n_out: int = 2000, method: str = "lttb", **kwargs: Any) -> DownsampledLine:
+    """
+    Drop-in for ax.plot(x, y) on large sorted series.
+    Example: plot_downsampled(ax, t, signal, n_out=2000, color="C0")
+    """
+    return DownsampledLine(ax, x, y, n_out, method, **kwargs)
+
+
+if __name__ == "__main__":
+    import io
+    import time
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    n = 1_000_000
+    t = np.linspace(0, 100, n)
+    signal = np.sin(t) + np.random.default_rng(0).normal(scale=0.2, size=n)
+
+    def render(plot: Any) -> float:
+        fig, ax = plt.subplots()
+        start = time.perf_counter()
+        plot(ax)
+        fig.savefig(io.BytesIO(), format="png")
+        elapsed = time.perf_counter() - start
+        plt.close(fig)
+        return elapsed
+
+    naive = render(lambda ax: ax.plot(t, signal))
+    print(f"naive plot ({n:,} points): {naive:.3f}s")
+    for method in ("lttb", "minmax"):
+        fast = render(lambda ax: plot_downsampled(ax, t, signal, 2000, method))
+        print(f"{method} plot (2,000 points): {fast:.3f}s ({naive / fast:.0f}x faster)")
+
+    df = pd.DataFrame({"A": signal, "B": np.cumsum(signal)})
+    full, small = len(df.to_json()), len(downsample_frame(df).to_json())
+    print(f"st.line_chart payload: {full / 1e6:.1f} MB -> {small / 1e3:.0f} KB ({full / small:.0f}x smaller)")
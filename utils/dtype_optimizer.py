@@ -0,0 +1,162 @@
+"""
+dtype_optimizer.py
+------------------
+Shrink DataFrame memory by choosing tighter dtypes.
+
+pd.read_csv infers int64/float64/object for everything. optimize_dtypes:
+- downcasts integers to the smallest int/uint type that holds the range
+- downcasts floats to float32 only where no value changes (or always, with lossy_floats=True)
+- turns low-cardinality strings (e.g. day, sex, class in the seaborn datasets) into categoricals
+- stores the remaining strings as Arrow-backed strings when pyarrow is installed
+The chosen dtypes form a schema that can be saved as JSON, so later loads pass
+dtype= straight to read_csv and skip inference entirely. The schema records the
+size and mtime of the file it was inferred from; if the file has changed since,
+the dtypes are inferred again (a stale uint8 would silently wrap new values).
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """Total bytes used by df, including string contents."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _optimize_column(col: pd.Series, category_threshold: float, lossy_floats: bool) -> pd.Series:
+    dtype = col.dtype
+    if pd.api.types.is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+        return col
+    if pd.api.types.is_integer_dtype(dtype):
+        downcast = "unsigned" if len(col) and col.min() >= 0 else "integer"
+        return pd.to_numeric(col, downcast=downcast)
+    if pd.api.types.is_float_dtype(dtype):
+        as_float32 = col.astype(np.float32)
+        if lossy_floats or np.array_equal(as_float32.to_numpy(dtype=np.float64), col.to_numpy(), equal_nan=True):
+            return as_float32
+        return col
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        non_null = col.dropna()
+        if len(non_null) and not non_null.map(type).eq(str).all():
+            return col  # mixed Python objects: leave alone
+        if len(col) and col.nunique() / len(col) <= category_threshold:
+            return col.astype("category")
+        return col.astype(STRING_DTYPE)
+    return col
+
+
+def optimize_dtypes(df: pd.DataFrame, category_threshold: float = 0.5, lossy_floats: bool = False) -> pd.DataFrame:
+    """
+    Return a copy of df with smaller dtypes.
+    A string column becomes categorical when its distinct/rows ratio is at most category_threshold.
+    """
+    return pd.DataFrame(
+        {name: _optimize_column(col, category_threshold, lossy_floats) for name, col in df.items()},
+        index=df.index,
+    )
+
+
+def compare_memory(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Per-column dtype and bytes before and after optimization."""
+    table = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_before": before.memory_usage(deep=True, index=False),
+        "bytes_after": after.memory_usage(deep=True, index=False),
+    })
+    table["ratio"] = table["bytes_before"] / table["bytes_after"]
+    return table
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> str:
+    b, a = memory_usage(before), memory_usage(after)
+    return f"Memory: {b / 2**20:.2f} MB -> {a / 2**20:.2f} MB ({b / a:.1f}x smaller)"
+
+
+# =========================
+# SCHEMAS
+# =========================
+def infer_schema(df: pd.DataFrame) -> dict[str, str]:
+    """Column -> dtype string, usable as read_csv(dtype=...)."""
+    return {str(name): str(dtype) for name, dtype in df.dtypes.items()}
+
+
+def file_signature(path: str) -> dict[str, int]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def save_schema(schema: dict[str, str], path: str, source: str | None = None) -> None:
+    """Write schema as JSON; with source, also the signature of the file it describes."""
+    data: dict[str, Any] = {"columns": schema}
+    if source is not None:
+        data["source"] = file_signature(source)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def _load_schema_file(path: str) -> dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_schema(path: str) -> dict[str, str]:
+    return _load_schema_file(path)["columns"]
+
+
+def read_csv_optimized(
+    filename: str,
+    schema_path: str | None = None,
+    report: bool = False,
+    category_threshold: float = 0.5,
+    lossy_floats: bool = False,
+    **read_csv_kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Read a CSV with optimized dtypes.
+    If schema_path exists and was saved for the file as it is now, its dtypes are used
+    directly (no inference); otherwise dtypes are inferred, optimized and saved to
+    schema_path (when given).
+    """
+    saved = _load_schema_file(schema_path) if schema_path and os.path.exists(schema_path) else None
+    if saved is not None and saved.get("source") == file_signature(filename):
+        schema = saved["columns"]
+        # Datetime columns cannot go through dtype=; parse them separately.
+        dates = [c for c, d in schema.items() if d.startswith("datetime64")]
+        dtypes = {c: d for c, d in schema.items() if c not in dates}
+        return pd.read_csv(filename, dtype=dtypes, parse_dates=dates or None, **read_csv_kwargs)
+    raw = pd.read_csv(filename, **read_csv_kwargs)
+    df = optimize_dtypes(raw, category_threshold, lossy_floats)
+    if report:
+        print(memory_report(raw, df))
+    if schema_path:
+        save_schema(infer_schema(df), schema_path, source=filename)
+    return df
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n = 200_000
+    wide = pd.DataFrame({
+        "day": rng.choice(["Thur", "Fri", "Sat", "Sun"], n),
+        "sex": rng.choice(["Male", "Female"], n),
+        "class": rng.choice(["First", "Second", "Third"], n),
+        "age": rng.integers(0, 90, n),
+        "fare": rng.integers(0, 500, n) / 4,
+        "name": [f"passenger-{i}" for i in range(n)],
+    })
+    wide = wide.astype({"day": object, "sex": object, "class": object, "name": object})
+    small = optimize_dtypes(wide)
+    print(compare_memory(wide, small))
+    print(memory_report(wide, small))
@@ -0,0 +1,58 @@
+"""
+fingerprint.py
+--------------
+Content fingerprints for arrays, DataFrames and plain Python values.
+Used as cache keys: equal content gives an equal fingerprint, any change gives a new one.
+Values whose content cannot be read (they do not pickle, e.g. objects holding a lock)
+get a fresh fingerprint every time, so they always count as changed.
+"""
+from __future__ import annotations
+
+import hashlib
+import pickle
+import uuid
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+def _update(h: Any, obj: Any) -> None:
+    if isinstance(obj, np.ndarray):
+        h.update(f"ndarray:{obj.dtype.str}:{obj.shape}".encode())
+        if obj.dtype.hasobject:
+            h.update(pickle.dumps(obj.tolist()))
+        else:
+            h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, pd.DataFrame):
+        h.update(f"frame:{obj.shape}:{list(map(str, obj.columns))}:{list(map(str, obj.dtypes))}".encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().data)
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        h.update(f"{type(obj).__name__}:{obj.dtype}:{obj.name}:{len(obj)}".encode())
+        h.update(pd.util.hash_pandas_object(obj).to_numpy().data)
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}:{len(obj)}".encode())
+        for item in obj:
+            _update(h, item)
+    elif isinstance(obj, dict):
+        h.update(f"dict:{len(obj)}".encode())
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    else:
+        try:
+            h.update(pickle.dumps(obj))
+        except Exception:
+            # repr() of most such objects is identity-based and would hide in-place mutation.
+            h.update(uuid.uuid4().bytes)
+
+
+def fingerprint(*objs: Any) -> str:
+    """
+    Hex digest of the content of objs.
+    Arrays and frames are hashed by value (vectorized), not by identity.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for obj in objs:
+        _update(h, obj)
+    return h.hexdigest()
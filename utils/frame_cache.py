@@ -0,0 +1,148 @@
+"""
+frame_cache.py
+--------------
+Memoize DataFrame operations such as filters, pivots and group-bys.
+
+Repeating flights.pivot(index="month", columns="year", values="passengers")
+on an unchanged frame returns the cached result. Keys combine a content
+fingerprint of the frame (shape, dtypes and a vectorized hash of every value)
+with the operation and its arguments. Hashing every value costs a fraction of
+the operation itself, and it is what keeps hits correct after in-place
+mutation: a sampled hash would miss edits outside the sample.
+
+Memory is bounded by max_bytes with least-recently-used eviction.
+
+    cache = FrameCache()
+    table = cache.run(flights, "pivot", index="month", columns="year", values="passengers")
+    top = cache.apply(tips, lambda df: df[df["tip"] > 5])
+    cache.stats()  # {'hits': ..., 'misses': ..., 'hit_rate': ..., ...}
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import types
+from collections import OrderedDict
+from typing import Any, Callable
+
+import pandas as pd
+
+from utils.fingerprint import fingerprint
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    return sys.getsizeof(value)
+
+
+def _copy(value: Any) -> Any:
+    """Hand out copies so callers cannot mutate what is stored in the cache."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return value
+
+
+def _referenced(value: Any, depth: int) -> Any:
+    if isinstance(value, types.ModuleType):
+        return ("module", value.__name__)
+    if isinstance(value, types.FunctionType) and depth < 3:
+        return _function_key(value, depth + 1)
+    return value
+
+
+def _global_names(code: types.CodeType) -> list[str]:
+    """co_names of code and of every nested code object (inner functions, lambdas, comprehensions)."""
+    names = dict.fromkeys(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(dict.fromkeys(_global_names(const)))
+    return list(names)
+
+
+def _function_key(func: Callable[..., Any], depth: int = 0) -> tuple[Any, ...]:
+    """
+    The function's name and bytecode plus the values it closes over and the globals it
+    reads, so above(2) and above(5), or a changed global threshold, get different keys.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return (getattr(func, "__module__", None), getattr(func, "__qualname__", repr(func)))
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(_referenced(cell.cell_contents, depth))
+        except ValueError:  # a cell not assigned yet
+            cells.append(None)
+    namespace = getattr(func, "__globals__", {})
+    used_globals = [(name, _referenced(namespace[name], depth)) for name in _global_names(code) if name in namespace]
+    return (func.__module__, func.__qualname__, code.co_code, repr(code.co_consts), tuple(cells), tuple(used_globals))
+
+
+class FrameCache:
+    """
+    LRU cache of DataFrame operation results, bounded by total result size in bytes.
+    """
+    def __init__(self, max_bytes: int = 256 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return _copy(self._entries[key][0])
+            self.misses += 1
+        value = compute()
+        size = _nbytes(value)
+        with self._lock:
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+                    self.evictions += 1
+        return _copy(value)
+
+    def run(self, df: pd.DataFrame, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Cached df.<method>(*args, **kwargs), e.g. run(df, "pivot", index=..., columns=..., values=...)."""
+        key = fingerprint(df, method, args, kwargs)
+        return self._lookup(key, lambda: getattr(df, method)(*args, **kwargs))
+
+    def apply(self, df: pd.DataFrame, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Cached func(df, *args, **kwargs); func is identified by its bytecode, closure and globals."""
+        key = fingerprint(df, _function_key(func), args, kwargs)
+        return self._lookup(key, lambda: func(df, *args, **kwargs))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+default_cache = FrameCache()
+
+
+def cached(df: pd.DataFrame, method: str, *args: Any, **kwargs: Any) -> Any:
+    """Shortcut for default_cache.run(...)."""
+    return default_cache.run(df, method, *args, **kwargs)
@@ -0,0 +1,82 @@
+"""
+histogram.py
+------------
+Fixed-bucket histograms for latencies and sizes.
+
+Recording is a bisect plus an integer increment, so it is cheap enough for hot
+paths; percentiles are estimated from bucket upper bounds.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Sequence
+
+
+def exponential_buckets(start: float, factor: float, count: int) -> list[float]:
+    """Bucket upper bounds start, start*factor, start*factor**2, ..."""
+    return [start * factor ** i for i in range(count)]
+
+
+class Histogram:
+    """
+    Thread-safe histogram with fixed upper bounds plus an overflow bucket.
+    Example: h = Histogram(exponential_buckets(0.001, 2, 16)); h.record(0.004)
+    """
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def merge(self, other: Histogram) -> None:
+        """Add other's counts into this histogram (bounds must match)."""
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different bounds")
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+            self.count += other.count
+            self.total += other.total
+            self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100)."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def buckets(self) -> list[tuple[str, int]]:
+        """Non-empty buckets as (label, count) pairs, for printing."""
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}" if self.bounds else "all"]
+        return [(label, n) for label, n in zip(labels, self.counts) if n]
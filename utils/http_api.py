@@ -0,0 +1,249 @@
+"""
+http_api.py
+-----------
+HTTP JSON API for the code runner, independent of Streamlit.
+
+    python -m utils.http_api --port 8765
+
+Endpoints (all JSON, HTTP/1.1 keep-alive):
+    POST /run          {"code": "...", "vectorize": false, "full_output": false}
+                       -> the run result; with "async": true -> 202 {"id": ...}
+    POST /run/batch    {"snippets": [{"code": ...}, ...]}
+                       -> NDJSON, one {"index": i, ...result} line per snippet
+                          as soon as it finishes (so possibly out of order)
+    GET  /jobs/{id}    -> {"id", "status": "pending"|"running"|"done", "result"?}
+    GET  /health       -> {"status": "ok", "runner": ...}
+
+/run and /run/batch responses use chunked transfer encoding: batch lines are
+sent as snippets complete, and large outputs are sent in 64 KB chunks.
+Runs go through code_runner.default_runner(), so CODE_RUNNER=pool serves
+them from supervised worker processes.
+
+A result looks like:
+    {"stdout": "...", "error": null | {"type": "ZeroDivisionError", "message": "..."},
+     "truncated": false, "total_chars": 12, "executed": 3, "seconds": 0.01}
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from utils import code_runner
+from utils.code_runner import RunResult
+
+MAX_BODY_BYTES = 2**20
+MAX_BATCH = 100
+CHUNK_BYTES = 2**16
+
+
+def result_to_json(result: RunResult, full_output: bool = False) -> dict[str, Any]:
+    output = result.output
+    data: dict[str, Any] = {
+        "stdout": result.stdout,
+        "error": None if result.error is None else {"type": type(result.error).__name__, "message": str(result.error)},
+        "truncated": bool(output is not None and output.truncated),
+        "total_chars": output.total_chars if output is not None else len(result.stdout),
+        "executed": result.executed,
+        "seconds": round(result.seconds, 6),
+    }
+    if full_output and data["truncated"]:
+        data["full_output"] = output.full_output()
+    return data
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ApiServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer plus the runner, a pool for batch/async runs and the job table."""
+    daemon_threads = True
+    # Many short keep-alive clients (load tests) connect at once.
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], runner: Any = None, workers: int = 8, max_jobs: int = 10_000) -> None:
+        super().__init__(address, _Handler)
+        self.runner = runner or code_runner.default_runner()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="api-run")
+        self.max_jobs = max_jobs
+        self.jobs: OrderedDict[str, tuple[Future, bool]] = OrderedDict()
+        self.jobs_lock = threading.Lock()
+
+    def submit(self, snippet: dict[str, Any]) -> Future:
+        return self.executor.submit(self.runner.run, snippet["code"], bool(snippet.get("vectorize", False)))
+
+    def add_job(self, future: Future, full_output: bool) -> str:
+        job_id = uuid.uuid4().hex
+        with self.jobs_lock:
+            self.jobs[job_id] = (future, full_output)
+            # Forget the oldest finished jobs beyond max_jobs.
+            while len(self.jobs) > self.max_jobs:
+                oldest = next(iter(self.jobs))
+                if not self.jobs[oldest][0].done():
+                    break
+                del self.jobs[oldest]
+        return job_id
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _snippet(data: Any) -> dict[str, Any]:
+    if not isinstance(data, dict) or not isinstance(data.get("code"), str):
+        raise _BadRequest(HTTPStatus.BAD_REQUEST, 'expected an object with a "code" string')
+    return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ApiServer
+
+    def setup(self) -> None:
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle + delayed ACK add ~40 ms.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # one line per request would dominate at load-test rates
+
+    # --- responses ---
+    def _send_json(self, status: HTTPStatus, data: Any) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        for i in range(0, len(data), CHUNK_BYTES):
+            part = data[i:i + CHUNK_BYTES]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_json(self) -> Any:
+        header = self.headers.get("Content-Length")
+        if header is None:
+            raise _BadRequest(HTTPStatus.LENGTH_REQUIRED, "Content-Length required")
+        # Plain ASCII digits only: "-1" would make rfile.read() wait for the client to close.
+        header = header.strip()
+        if not (header.isascii() and header.isdigit()):
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, f"invalid Content-Length {header!r}")
+        length = int(header)
+        if length > MAX_BODY_BYTES:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body larger than {MAX_BODY_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError as e:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}") from None
+
+    # --- routes ---
+    def do_GET(self) -> None:
+        try:
+            if self.path == "/health":
+                self._send_json(HTTPStatus.OK, {"status": "ok", "runner": type(self.server.runner).__name__})
+            elif self.path.startswith("/jobs/"):
+                self._get_job(self.path[len("/jobs/"):])
+            else:
+                raise _BadRequest(HTTPStatus.NOT_FOUND, f"no route for GET {self.path}")
+        except _BadRequest as e:
+            self._send_json(e.status, {"error": str(e)})
+
+    def _reject(self, error: _BadRequest) -> None:
+        # The request body may be partly unread, so the connection cannot be reused safely.
+        self.close_connection = True
+        self._send_json(error.status, {"error": str(error)})
+
+    def do_POST(self) -> None:
+        try:
+            if self.path == "/run":
+                self._run(_snippet(self._read_json()))
+            elif self.path == "/run/batch":
+                self._run_batch(self._read_json())
+            else:
+                raise _BadRequest(HTTPStatus.NOT_FOUND, f"no route for POST {self.path}")
+        except _BadRequest as e:
+            self._reject(e)
+
+    def _run(self, snippet: dict[str, Any]) -> None:
+        full_output = bool(snippet.get("full_output", False))
+        if snippet.get("async"):
+            job_id = self.server.add_job(self.server.submit(snippet), full_output)
+            self._send_json(HTTPStatus.ACCEPTED, {"id": job_id})
+            return
+        # Synchronous runs stay on this connection's thread: no hand-off latency.
+        result = self.server.runner.run(snippet["code"], bool(snippet.get("vectorize", False)))
+        body = json.dumps(result_to_json(result, full_output)).encode()
+        self._start_chunked("application/json")
+        self._write_chunk(body)
+        self._end_chunked()
+
+    def _run_batch(self, data: Any) -> None:
+        snippets = data.get("snippets") if isinstance(data, dict) else None
+        if not isinstance(snippets, list) or not snippets:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, 'expected {"snippets": [{"code": ...}, ...]}')
+        if len(snippets) > MAX_BATCH:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"at most {MAX_BATCH} snippets per batch")
+        snippets = [_snippet(s) for s in snippets]
+        futures = {self.server.submit(s): i for i, s in enumerate(snippets)}
+        self._start_chunked("application/x-ndjson")
+        for future in as_completed(futures):
+            i = futures[future]
+            line = {"index": i, **result_to_json(future.result(), bool(snippets[i].get("full_output", False)))}
+            self._write_chunk(json.dumps(line).encode() + b"\n")
+        self._end_chunked()
+
+    def _get_job(self, job_id: str) -> None:
+        with self.server.jobs_lock:
+            job = self.server.jobs.get(job_id)
+        if job is None:
+            raise _BadRequest(HTTPStatus.NOT_FOUND, f"unknown job {job_id}")
+        future, full_output = job
+        if future.done():
+            self._send_json(HTTPStatus.OK, {"id": job_id, "status": "done", "result": result_to_json(future.result(), full_output)})
+        else:
+            self._send_json(HTTPStatus.OK, {"id": job_id, "status": "running" if future.running() else "pending"})
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, runner: Any = None, workers: int = 8) -> ApiServer:
+    """Start the API in a background thread and return the server (call shutdown() to stop)."""
+    server = ApiServer((host, port), runner, workers)
+    threading.Thread(target=server.serve_forever, daemon=True, name="http-api").start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP JSON API for the code runner")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8, help="concurrent runs (batch and async)")
+    args = parser.parse_args()
+    server = ApiServer((args.host, args.port), workers=args.workers)
+    print(f"serving on http://{args.host}:{server.server_address[1]} with {type(server.runner).__name__}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,354 @@
+"""
+loadtest.py
+-----------
+Load generator that replays learner sessions against the execution engine.
+
+A session picks a topic module from basics/ (and/or data_science/), then
+repeatedly edits it (changes a number, adds a print) and runs it, with an
+exponentially distributed think time between runs; exactly what a class
+does in the practice editor. Sessions are started either by `users`
+virtual learners in a closed loop, or by a Poisson arrival process
+(arrival_rate sessions/s) with at most `users` active at once.
+
+    python -m utils.loadtest --target inline --users 20 --duration 60 --out before.json
+    python -m utils.loadtest --target http://127.0.0.1:8765 --server-pid 1234 --out after.json
+    python -m utils.loadtest --compare before.json after.json
+
+Targets: inline, pool[:N] (utils.worker_pool), http://host:port
+(utils.http_api) or broker://host:port (utils.broker). Everything runs
+locally. The JSON report has throughput, the latency distribution, engine
+and code error rates and a timeline of the server's RSS (the process tree
+of --server-pid, or this process for in-process targets).
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any
+from urllib.parse import urlparse
+
+from utils import code_runner
+from utils.broker import result_from_json
+from utils.code_runner import RunResult
+from utils.histogram import Histogram, exponential_buckets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCY_BUCKETS = exponential_buckets(1e-4, 2 ** 0.25, 96)   # 0.1 ms .. ~2 min, 19% steps
+INTEGER = re.compile(r"(?<![\w.])\d+(?![\w.])")
+
+
+@dataclass
+class LoadConfig:
+    target: str = "inline"
+    users: int = 10
+    arrival_rate: float = 0.0       # sessions per second; 0 = closed loop with `users` learners
+    duration: float = 30.0
+    runs_per_session: int = 5
+    think_time: float = 1.0         # mean seconds between runs in a session
+    topics: tuple[str, ...] = ("basics",)
+    seed: int = 0
+    rss_interval: float = 1.0
+    server_pid: int | None = None
+
+
+# =========================
+# TARGETS
+# =========================
+class HttpTarget:
+    """Client for utils.http_api; one keep-alive connection per thread."""
+    def __init__(self, url: str, timeout: float = 120.0) -> None:
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname or "127.0.0.1", parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def run(self, code: str, vectorize: bool = False) -> RunResult:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", "/run", json.dumps({"code": code, "vectorize": vectorize}),
+                         {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.status != 200:
+            raise ConnectionError(f"HTTP {response.status}: {body[:200]!r}")
+        return result_from_json(json.loads(body))
+
+
+def make_target(spec: str) -> Any:
+    if spec == "inline":
+        return code_runner.InlineRunner()
+    if spec.startswith("pool"):
+        from utils.worker_pool import WorkerPool
+        _, _, size = spec.partition(":")
+        return WorkerPool(size=int(size or 2))
+    if spec.startswith("http://"):
+        return HttpTarget(spec)
+    if spec.startswith("broker://"):
+        from utils.broker import BrokerRunner
+        return BrokerRunner(spec[len("broker://"):])
+    raise ValueError(f"unknown target {spec!r}")
+
+
+# =========================
+# MEASUREMENT
+# =========================
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def process_tree_rss(pid: int) -> int:
+    """RSS of pid plus all its descendants (worker processes), from /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # Field 4 is the parent pid; the command name (field 2) may contain spaces.
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _rss(current)
+        stack.extend(children.get(current, []))
+    return total
+
+
+def load_topics(dirs: tuple[str, ...]) -> dict[str, str]:
+    topics = {}
+    for directory in dirs:
+        path = os.path.join(ROOT, directory)
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".py") and not name.startswith("__"):
+                with open(os.path.join(path, name)) as f:
+                    topics[f"{directory}/{name}"] = f.read()
+    return topics
+
+
+def edit(code: str, rng: random.Random) -> str:
+    """A learner-style edit: change one integer literal, or add a print at the end."""
+    numbers = list(INTEGER.finditer(code))
+    if numbers and rng.random() < 0.5:
+        match = rng.choice(numbers)
+        return code[:match.start()] + str(rng.randint(1, 20)) + code[match.end():]
+    return code + f"\nprint('edit {rng.randint(0, 10**6)}')\n"
+
+
+# Engine failures as they reach the client: raised locally, or as broker.RemoteError
+# (http:// and broker:// targets) carrying the original type name in .type.
+ENGINE_ERROR_TYPES = ("TimeoutError", "ConnectionError", "ConnectionRefusedError", "ConnectionResetError",
+                      "BrokenPipeError")
+ENGINE_ERROR_MESSAGES = ("The worker running this code crashed", "worker node lost")
+
+
+def _is_engine_error(error: BaseException | None) -> bool:
+    """Failures of the engine itself, as opposed to exceptions raised by the learner's code."""
+    if error is None:
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    type_name = getattr(error, "type", type(error).__name__)
+    return type_name in ENGINE_ERROR_TYPES or (
+        type_name == "RuntimeError" and any(message in str(error) for message in ENGINE_ERROR_MESSAGES))
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.lock = threading.Lock()
+        self.runs = self.sessions = self.engine_errors = self.code_errors = self.late_sessions = 0
+
+    def record(self, seconds: float, error: BaseException | None) -> None:
+        with self.lock:
+            self.runs += 1
+            self.latency.record(seconds)
+            if error is None:
+                return
+            if _is_engine_error(error):
+                self.engine_errors += 1
+            else:
+                self.code_errors += 1
+
+
+def _git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def run_load(config: LoadConfig, target: Any = None) -> dict[str, Any]:
+    """Generate load for config.duration seconds and return the report."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    owned = target is None
+    target = target or make_target(config.target)
+    topics = load_topics(config.topics)
+    names = sorted(topics)
+    recorder = _Recorder()
+    start = time.perf_counter()
+    deadline = start + config.duration
+    stop = threading.Event()
+    server_pid = config.server_pid or os.getpid()
+    timeline: list[dict[str, float]] = []
+
+    def sample_rss() -> None:
+        while True:
+            timeline.append({"t": round(time.perf_counter() - start, 3), "rss_mb": process_tree_rss(server_pid) / 2**20,
+                             "runs": recorder.runs})
+            if stop.wait(config.rss_interval):
+                return
+
+    def session(seed: int) -> None:
+        if time.perf_counter() >= deadline:
+            with recorder.lock:
+                recorder.late_sessions += 1
+            return
+        rng = random.Random(seed)
+        code = topics[rng.choice(names)]
+        with recorder.lock:
+            recorder.sessions += 1
+        for i in range(config.runs_per_session):
+            if i:
+                time.sleep(min(rng.expovariate(1 / config.think_time) if config.think_time else 0,
+                               max(deadline - time.perf_counter(), 0)))
+                code = edit(code, rng)
+            if time.perf_counter() >= deadline:
+                return
+            t0 = time.perf_counter()
+            try:
+                error = target.run(code).error
+            except Exception as e:
+                error = e
+            recorder.record(time.perf_counter() - t0, error)
+
+    def learner(index: int) -> None:
+        n = 0
+        while time.perf_counter() < deadline:
+            session(config.seed * 1_000_003 + index * 10_007 + n)
+            n += 1
+
+    sampler = threading.Thread(target=sample_rss, daemon=True, name="rss-sampler")
+    sampler.start()
+    try:
+        with ThreadPoolExecutor(config.users, thread_name_prefix="learner") as pool:
+            if config.arrival_rate > 0:
+                arrivals = random.Random(config.seed)
+                n = 0
+                while True:
+                    next_at = time.perf_counter() + arrivals.expovariate(config.arrival_rate)
+                    if next_at >= deadline:
+                        break
+                    time.sleep(max(next_at - time.perf_counter(), 0))
+                    pool.submit(session, config.seed * 1_000_003 + n)
+                    n += 1
+            else:
+                for i in range(config.users):
+                    pool.submit(learner, i)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        sampler.join()
+        # Worker processes started for this run (pool targets) must not outlive it.
+        if owned and hasattr(target, "shutdown"):
+            target.shutdown()
+
+    rss = [point["rss_mb"] for point in timeline]
+    return {
+        "version": _git_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": asdict(config),
+        "elapsed_s": round(elapsed, 3),
+        "sessions": recorder.sessions,
+        "late_sessions": recorder.late_sessions,
+        "runs": recorder.runs,
+        "throughput_rps": recorder.runs / elapsed if elapsed else 0.0,
+        "latency_s": recorder.latency.summary(),
+        "latency_buckets": recorder.latency.buckets(),
+        "engine_errors": recorder.engine_errors,
+        "code_errors": recorder.code_errors,
+        "error_rate": recorder.engine_errors / recorder.runs if recorder.runs else 0.0,
+        "rss_mb": {"start": rss[0], "max": max(rss), "end": rss[-1]} if rss else {},
+        "timeline": timeline,
+    }
+
+
+def summarize(report: dict[str, Any]) -> str:
+    lat = report["latency_s"]
+    return (f"{report['version']}  {report['config']['target']}  users={report['config']['users']}\n"
+            f"runs {report['runs']:,} in {report['elapsed_s']:.1f}s = {report['throughput_rps']:.1f} runs/s, "
+            f"{report['sessions']:,} sessions\n"
+            f"latency p50 {lat['p50'] * 1e3:.1f} ms  p95 {lat['p95'] * 1e3:.1f} ms  p99 {lat['p99'] * 1e3:.1f} ms  "
+            f"max {lat['max'] * 1e3:.1f} ms\n"
+            f"engine errors {report['engine_errors']} ({report['error_rate']:.2%}), code errors {report['code_errors']}\n"
+            f"RSS start {report['rss_mb'].get('start', 0):.0f} MB, max {report['rss_mb'].get('max', 0):.0f} MB, "
+            f"end {report['rss_mb'].get('end', 0):.0f} MB")
+
+
+def compare(base: dict[str, Any], new: dict[str, Any]) -> str:
+    """Side-by-side table of two reports; for latency, errors and memory lower is better."""
+    rows = [
+        ("throughput (runs/s)", base["throughput_rps"], new["throughput_rps"]),
+        ("latency p50 (ms)", base["latency_s"]["p50"] * 1e3, new["latency_s"]["p50"] * 1e3),
+        ("latency p95 (ms)", base["latency_s"]["p95"] * 1e3, new["latency_s"]["p95"] * 1e3),
+        ("latency p99 (ms)", base["latency_s"]["p99"] * 1e3, new["latency_s"]["p99"] * 1e3),
+        ("engine error rate (%)", base["error_rate"] * 100, new["error_rate"] * 100),
+        ("max RSS (MB)", base["rss_mb"].get("max", 0), new["rss_mb"].get("max", 0)),
+        ("RSS growth (MB)", base["rss_mb"].get("end", 0) - base["rss_mb"].get("start", 0),
+         new["rss_mb"].get("end", 0) - new["rss_mb"].get("start", 0)),
+    ]
+    lines = [f"{'metric':<24} {base['version'][:14]:>14} {new['version'][:14]:>14} {'change':>9}"]
+    for name, a, b in rows:
+        change = f"{(b - a) / a:+.1%}" if a else "n/a"
+        lines.append(f"{name:<24} {a:>14.2f} {b:>14.2f} {change:>9}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent learners against the execution engine")
+    parser.add_argument("--target", default="inline", help="inline, pool[:N], http://host:port or broker://host:port")
+    parser.add_argument("--users", type=int, default=10, help="concurrent learners")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="new sessions per second (0: closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--runs-per-session", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0)
+    parser.add_argument("--topics", default="basics", help="comma-separated topic folders")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-pid", type=int, help="pid of the server whose RSS to sample (remote targets)")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            print(compare(json.load(f), json.load(g)))
+    else:
+        config = LoadConfig(args.target, args.users, args.arrival_rate, args.duration, args.runs_per_session,
+                            args.think_time, tuple(args.topics.split(",")), args.seed, server_pid=args.server_pid)
+        report = run_load(config)
+        print(summarize(report))
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
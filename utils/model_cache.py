@@ -0,0 +1,164 @@
+"""
+model_cache.py
+--------------
+Cache fitted scikit-learn estimators so unchanged lessons skip training.
+
+Entries are keyed by the training data fingerprint, the estimator class and its
+hyperparameters, kept in memory and on disk with joblib (large arrays such as
+``coef_`` are memory-mapped on load). When only the hyperparameters change, a
+previously fitted estimator of the same class on the same data is used as a
+warm start if the estimator supports ``warm_start``: for linear models when
+``max_iter`` is unchanged (their fitted state is just coefficients, which the
+solver moves to the new optimum within the same iteration budget), for
+ensembles only when ``n_estimators`` grew and nothing else changed, since the
+existing trees were built with the old structural parameters and are kept.
+Every call returns its own copy, so callers may refit or mutate the result.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from typing import Any
+
+import joblib
+from sklearn.base import BaseEstimator, clone
+
+from utils.fingerprint import fingerprint
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "models")
+# Parameters that only add to a fit: a fit with a smaller value is a valid starting point.
+GROWTH_PARAMS = ("n_estimators",)
+
+
+def _class_path(estimator: BaseEstimator) -> str:
+    cls = type(estimator)
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _params_key(estimator: BaseEstimator) -> str:
+    params = estimator.get_params(deep=True)
+    # warm_start only changes how a fit starts, not which model we want back.
+    params.pop("warm_start", None)
+    return hashlib.blake2b(repr(sorted(params.items(), key=lambda kv: kv[0])).encode(), digest_size=12).hexdigest()
+
+
+def _warm_start_compatible(previous: BaseEstimator, estimator: BaseEstimator) -> bool:
+    if type(previous) is not type(estimator):
+        return False
+    old, new = previous.get_params(deep=False), estimator.get_params(deep=False)
+    if _class_path(estimator).startswith("sklearn.linear_model."):
+        # A warm-started solver runs max_iter more iterations; only equal budgets give the requested fit.
+        return old.get("max_iter") == new.get("max_iter")
+    for name in GROWTH_PARAMS:
+        if name in new and not (isinstance(old.get(name), int) and isinstance(new[name], int) and new[name] >= old[name]):
+            return False
+    return all(repr(old.get(name)) == repr(value) for name, value in new.items()
+               if name not in (*GROWTH_PARAMS, "warm_start"))
+
+
+class ModelCache:
+    """
+    Two-level (memory LRU + joblib files) cache of fitted estimators.
+    Call fit() instead of estimator.fit(); a hit returns the cached model without training.
+    """
+    def __init__(self, cache_dir: str | None = None, max_in_memory: int = 16) -> None:
+        self.cache_dir = cache_dir or os.environ.get("MODEL_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_in_memory = max_in_memory
+        self._memory: OrderedDict[str, BaseEstimator] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "warm_starts": 0}
+
+    def _entry_dir(self, data_key: str, estimator: BaseEstimator) -> str:
+        return os.path.join(self.cache_dir, data_key, _class_path(estimator))
+
+    def _remember(self, key: str, model: BaseEstimator) -> None:
+        self._memory[key] = model
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_in_memory:
+            self._memory.popitem(last=False)
+
+    def fit(self, estimator: BaseEstimator, X: Any, y: Any = None, warm_start: bool = True) -> BaseEstimator:
+        """
+        Return a fitted estimator equivalent to estimator.fit(X, y), reusing a cached fit when possible.
+        The estimator passed in is never modified, and each call returns its own copy of the cached model.
+        """
+        data_key = fingerprint(X, y)
+        entry_dir = self._entry_dir(data_key, estimator)
+        params_key = _params_key(estimator)
+        key = f"{data_key}/{_class_path(estimator)}/{params_key}"
+        path = os.path.join(entry_dir, f"{params_key}.joblib")
+
+        if key in self._memory:
+            self.stats["hits"] += 1
+            self._memory.move_to_end(key)
+            return copy.deepcopy(self._memory[key])
+        if os.path.exists(path):
+            self.stats["hits"] += 1
+            model = joblib.load(path, mmap_mode="r")
+            self._remember(key, model)
+            return copy.deepcopy(model)
+
+        self.stats["misses"] += 1
+        model = None
+        if warm_start and "warm_start" in estimator.get_params():
+            model = self._warm_start(entry_dir, estimator, X, y)
+        if model is None:
+            model = clone(estimator).fit(X, y)
+        os.makedirs(entry_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+        self._remember(key, model)
+        return copy.deepcopy(model)
+
+    def _warm_start(self, entry_dir: str, estimator: BaseEstimator, X: Any, y: Any) -> BaseEstimator | None:
+        """Refit the most recent compatible cached model of this class on this data with the new params."""
+        if not os.path.isdir(entry_dir):
+            return None
+        candidates = sorted((e for e in os.scandir(entry_dir) if e.name.endswith(".joblib")),
+                            key=lambda e: e.stat().st_mtime, reverse=True)
+        previous = None
+        for candidate in candidates:
+            # Load without mmap: warm-started solvers update the coefficients in place.
+            model = joblib.load(candidate.path)
+            if _warm_start_compatible(model, estimator):
+                previous = model
+                break
+        if previous is None:
+            return None
+        params = estimator.get_params(deep=False)
+        requested_warm_start = params.pop("warm_start")
+        try:
+            previous.set_params(**params, warm_start=True)
+            previous.fit(X, y)
+        except (ValueError, TypeError):
+            # Incompatible previous state (e.g. a different number of features); train from scratch.
+            return None
+        previous.set_params(warm_start=requested_warm_start)
+        self.stats["warm_starts"] += 1
+        return previous
+
+    def clear(self) -> None:
+        """Drop every cached model from memory and disk."""
+        self._memory.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+_default_cache: ModelCache | None = None
+
+
+def default_cache() -> ModelCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ModelCache()
+    return _default_cache
+
+
+def cached_fit(estimator: BaseEstimator, X: Any, y: Any = None, warm_start: bool = True) -> BaseEstimator:
+    """
+    Fit estimator on (X, y) through the default ModelCache.
+    Example: clf = cached_fit(LogisticRegression(max_iter=200), X_train, y_train)
+    """
+    return default_cache().fit(estimator, X, y, warm_start=warm_start)
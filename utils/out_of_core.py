@@ -0,0 +1,175 @@
+"""
+out_of_core.py
+--------------
+Train scikit-learn estimators on data that does not fit in memory.
+
+Batches are streamed from a chunked CSV reader or from a memory-mapped array
+and fed to estimators that implement partial_fit (SGDClassifier,
+SGDRegressor, MiniBatchKMeans, IncrementalPCA, ...). A prefetch thread reads
+the next batch while the current one is being fitted, and at most
+prefetch_depth + 1 batches are in memory at any time, however large the
+dataset grows.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, is_classifier, is_regressor
+
+Batch = tuple[np.ndarray, np.ndarray | None]
+
+
+def iter_csv_batches(
+    path: str,
+    target: str | None = None,
+    batch_size: int = 10_000,
+    features: list[str] | None = None,
+    dtype: Any = np.float32,
+) -> Iterator[Batch]:
+    """
+    Yield (X, y) batches from a CSV file, reading batch_size rows at a time.
+    y is None when target is None (unsupervised estimators).
+    """
+    usecols = None if features is None else features + ([target] if target else [])
+    for chunk in pd.read_csv(path, chunksize=batch_size, usecols=usecols):
+        y = chunk.pop(target).to_numpy() if target else None
+        if features is not None:
+            chunk = chunk[features]
+        yield chunk.to_numpy(dtype=dtype), y
+
+
+def iter_array_batches(X: np.ndarray, y: np.ndarray | None = None, batch_size: int = 10_000) -> Iterator[Batch]:
+    """
+    Yield (X, y) batches from arrays, typically np.load(..., mmap_mode="r")
+    or utils.shared_datasets views. Only the current batch is paged in.
+    """
+    for start in range(0, len(X), batch_size):
+        stop = start + batch_size
+        yield np.ascontiguousarray(X[start:stop]), None if y is None else np.asarray(y[start:stop])
+
+
+_DONE = object()
+
+
+def prefetch(batches: Iterable[Any], depth: int = 2) -> Iterator[Any]:
+    """
+    Iterate over batches while a background thread reads ahead up to depth items.
+    Exceptions raised by the reader are re-raised in the consumer.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        # Give up when the consumer has stopped, instead of blocking on a full queue forever.
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader() -> None:
+        try:
+            for item in batches:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+@dataclass
+class TrainingReport:
+    """Throughput of one out-of-core training pass."""
+    rows: int
+    batches: int
+    seconds: float
+    wait_seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.rows:,} rows in {self.batches} batches, {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s, {self.wait_seconds:.2f}s waiting on I/O)")
+
+
+def train_out_of_core(
+    estimator: BaseEstimator,
+    batches: Iterable[Batch],
+    classes: Any = None,
+    prefetch_depth: int = 2,
+) -> TrainingReport:
+    """
+    Fit estimator with one partial_fit call per batch.
+    Classifiers need classes (all labels) up front, since a batch may not contain every label.
+    """
+    if not hasattr(estimator, "partial_fit"):
+        raise TypeError(f"{type(estimator).__name__} does not support partial_fit")
+    supervised = is_classifier(estimator) or is_regressor(estimator)
+    if is_classifier(estimator) and classes is None:
+        raise ValueError("classes is required for classifiers (e.g. classes=np.arange(10))")
+
+    source = prefetch(batches, prefetch_depth) if prefetch_depth > 0 else iter(batches)
+    rows = n_batches = 0
+    wait = 0.0
+    start = time.perf_counter()
+    while True:
+        waited_from = time.perf_counter()
+        batch = next(source, None)
+        wait += time.perf_counter() - waited_from
+        if batch is None:
+            break
+        X, y = batch
+        if not supervised:
+            estimator.partial_fit(X)
+        elif is_classifier(estimator):
+            estimator.partial_fit(X, y, classes=classes)
+        else:
+            estimator.partial_fit(X, y)
+        rows += len(X)
+        n_batches += 1
+    return TrainingReport(rows, n_batches, time.perf_counter() - start, wait)
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.linear_model import SGDClassifier
+
+    rng = np.random.default_rng(0)
+    path = os.path.join(tempfile.mkdtemp(), "large.csv")
+    for i in range(10):
+        X = rng.normal(size=(50_000, 20))
+        frame = pd.DataFrame(X, columns=[f"f{j}" for j in range(20)])
+        frame["label"] = (X[:, 0] + X[:, 1] > 0).astype(int)
+        frame.to_csv(path, mode="a", header=(i == 0), index=False)
+
+    clf = SGDClassifier()
+    print("SGDClassifier:", train_out_of_core(clf, iter_csv_batches(path, "label", 20_000), classes=[0, 1]))
+    km = MiniBatchKMeans(n_clusters=4, n_init=3)
+    features = [f"f{j}" for j in range(20)]
+    print("MiniBatchKMeans:", train_out_of_core(km, iter_csv_batches(path, None, 20_000, features)))
+    os.remove(path)
@@ -0,0 +1,253 @@
+"""
+output_capture.py
+-----------------
+Bounded stdout capture for submitted code.
+
+io.StringIO keeps everything, so `for i in range(10**8): print(i)` grows
+until the server runs out of memory, then sends the browser a string it
+cannot render. BoundedOutput keeps only the first head_chars and the last
+tail_chars in memory (the tail is compacted whenever it doubles) and spools the full
+text to a temporary file, up to max_spool_chars; beyond that it only counts.
+
+    output = BoundedOutput()
+    with capture(output):           # print() and C-level writes to fd 1
+        exec(code, namespace)
+    output.getvalue()               # head + "... N characters omitted ..." + tail
+    output.full_output()            # everything spooled, for a download
+
+By default capture() is per thread: sys.stdout is replaced once by a router
+that sends each thread's writes to the target that thread is capturing
+into, so concurrent runs in the app's session threads neither mix their
+output nor wait for each other (threads started by the submitted code
+write to the real stdout).
+
+capture(fd=True) instead redirects file descriptor 1 through a pipe, so
+output from C extensions and subprocesses that bypass sys.stdout is
+included. The descriptor belongs to the whole process, so fd-level captures
+take turns on a process-wide lock; it is the default only where one run
+owns the process (worker_pool workers set CAPTURE_FD), or with CAPTURE_FD=1.
+"""
+from __future__ import annotations
+
+import codecs
+import contextlib
+import ctypes
+import io
+import os
+import sys
+import tempfile
+import threading
+from typing import Iterator
+
+HEAD_CHARS = 20_000
+TAIL_CHARS = 20_000
+MAX_SPOOL_CHARS = int(os.environ.get("OUTPUT_SPOOL_CHARS", 20 * 2**20))
+FLUSH_CHARS = 2**16
+CAPTURE_FD = os.environ.get("CAPTURE_FD", "0").lower() not in ("0", "false", "off", "no")
+
+_fd_lock = threading.Lock()
+_router_lock = threading.Lock()
+
+
+class BoundedOutput:
+    """
+    Text stream with a hard memory bound: head + tail in memory, the rest spooled to a temp file.
+    A plain class rather than an io.TextIOBase subclass: write() is the hot path of every print().
+    """
+    encoding = "utf-8"
+    errors = "replace"
+
+    def __init__(self, head_chars: int = HEAD_CHARS, tail_chars: int = TAIL_CHARS,
+                 max_spool_chars: int = MAX_SPOOL_CHARS) -> None:
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.max_spool_chars = max_spool_chars
+        self.total_chars = 0
+        self.spooled_chars = 0
+        self._head: list[str] = []
+        self._head_len = 0
+        self._recent: list[str] = []   # everything since the last flush; flushed every ~64K characters
+        self._recent_len = 0
+        self._tail = ""                # last tail_chars characters before the last flush
+        self._spool: io.TextIOBase | None = None
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return False
+
+    def fileno(self) -> int:
+        raise io.UnsupportedOperation("fileno")
+
+    def flush(self) -> None:
+        pass
+
+    def write(self, s: str) -> int:
+        n = len(s)
+        with self._lock:
+            self.total_chars += n
+            if self._head_len < self.head_chars:
+                part = s[:self.head_chars - self._head_len]
+                self._head.append(part)
+                self._head_len += len(part)
+            self._recent.append(s)
+            self._recent_len += n
+            if self._recent_len >= FLUSH_CHARS:
+                self._flush()
+        return n
+
+    def _flush(self) -> None:
+        """Move the recent text to the spool file (while under max_spool_chars) and into the tail."""
+        if not self._recent:
+            return
+        text = "".join(self._recent)
+        self._recent, self._recent_len = [], 0
+        room = self.max_spool_chars - self.spooled_chars
+        if room > 0:
+            if self._spool is None:
+                self._spool = tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace", prefix="run-output-")
+            part = text[:room]
+            self._spool.write(part)
+            self.spooled_chars += len(part)
+        self._tail = (self._tail + text)[-self.tail_chars:]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_chars > self.head_chars + self.tail_chars
+
+    @property
+    def spool_complete(self) -> bool:
+        return self.total_chars <= self.max_spool_chars
+
+    def getvalue(self) -> str:
+        """Everything if it fits, else the head, a marker with the number of omitted characters, and the tail."""
+        with self._lock:
+            head = "".join(self._head)
+            recent = self._tail + "".join(self._recent)
+            if not self.truncated:
+                rest = self.total_chars - self._head_len
+                return head + (recent[-rest:] if rest else "")
+            tail = recent[-self.tail_chars:]
+            omitted = self.total_chars - len(head) - len(tail)
+            return f"{head}\n\n... {omitted:,} characters omitted ...\n\n{tail}"
+
+    def iter_full(self, chunk_chars: int = 2**16) -> Iterator[str]:
+        """The spooled output in chunks (complete unless more than max_spool_chars were written)."""
+        with self._lock:
+            self._flush()
+            if self._spool is None:
+                return
+            self._spool.flush()
+            self._spool.seek(0)
+            while True:
+                chunk = self._spool.read(chunk_chars)
+                if not chunk:
+                    break
+                yield chunk
+            self._spool.seek(0, io.SEEK_END)
+
+    def full_output(self) -> str:
+        text = "".join(self.iter_full())
+        if not self.spool_complete:
+            text += f"\n\n... output stopped being saved after {self.max_spool_chars:,} characters ...\n"
+        return text
+
+    def close(self) -> None:
+        with self._lock:
+            self._recent, self._recent_len = [], 0
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+
+def _flush_c_stdio() -> None:
+    """Flush libc's stdout buffer so C-level printf output lands in the capture, not after it."""
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError):
+        pass
+
+
+@contextlib.contextmanager
+def capture_fd(target: BoundedOutput | io.TextIOBase, fd: int = 1) -> Iterator[None]:
+    """Send everything written to file descriptor fd into target, via a pipe drained by a thread."""
+    with _fd_lock:
+        if sys.__stdout__ is not None:
+            sys.__stdout__.flush()
+        _flush_c_stdio()
+        saved = os.dup(fd)
+        read_end, write_end = os.pipe()
+        os.dup2(write_end, fd)
+        os.close(write_end)
+
+        def drain() -> None:
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            while True:
+                chunk = os.read(read_end, 2**16)
+                if not chunk:
+                    break
+                target.write(decoder.decode(chunk))
+            target.write(decoder.decode(b"", final=True))
+
+        reader = threading.Thread(target=drain, daemon=True, name="fd-capture")
+        reader.start()
+        try:
+            yield
+        finally:
+            _flush_c_stdio()
+            os.dup2(saved, fd)  # closes the pipe's last write end, so drain() sees EOF
+            os.close(saved)
+            # A subprocess that inherited the pipe could keep it open; do not wait on it forever.
+            reader.join(timeout=1)
+            if not reader.is_alive():
+                os.close(read_end)
+
+
+class _StdoutRouter:
+    """sys.stdout stand-in that sends each thread's writes to the target that thread captures into."""
+    def __init__(self, default: io.TextIOBase | None) -> None:
+        self.default = default
+        self.local = threading.local()
+
+    def _target(self) -> BoundedOutput | io.TextIOBase | None:
+        return getattr(self.local, "target", None) or self.default
+
+    def write(self, s: str) -> int:
+        target = self._target()
+        return target.write(s) if target is not None else len(s)
+
+    def flush(self) -> None:
+        target = self._target()
+        if target is not None:
+            target.flush()
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._target(), name)
+
+
+@contextlib.contextmanager
+def capture_thread(target: BoundedOutput | io.TextIOBase) -> Iterator[None]:
+    """Send the calling thread's sys.stdout writes into target; other threads are unaffected."""
+    with _router_lock:
+        router = sys.stdout
+        if not isinstance(router, _StdoutRouter):
+            router = sys.stdout = _StdoutRouter(sys.stdout)
+    previous = getattr(router.local, "target", None)
+    router.local.target = target
+    try:
+        yield
+    finally:
+        router.local.target = previous
+
+
+@contextlib.contextmanager
+def capture(target: BoundedOutput | io.TextIOBase, fd: bool | None = None) -> Iterator[BoundedOutput | io.TextIOBase]:
+    """Capture the calling thread's sys.stdout into target; with fd=True (default: CAPTURE_FD), all of fd 1."""
+    if CAPTURE_FD if fd is None else fd:
+        with capture_fd(target), contextlib.redirect_stdout(target):
+            yield target
+    else:
+        with capture_thread(target):
+            yield target
@@ -0,0 +1,338 @@
+"""
+pipeline.py
+-----------
+Composable, lazy streaming pipelines built on generators.
+
+generator_example in basics/decorators_generators.py yields range(3); the same
+idea scales to ETL over CSV/JSONL files of any size. Each stage wraps the
+generator before it, so items flow one at a time and memory stays constant:
+
+    stats = (
+        Pipeline(read_lines("events.jsonl"), name="read")
+        .map(json.loads, name="parse")
+        .filter(lambda e: e["status"] == "ok", name="filter")
+        .map(enrich, workers=4, mode="thread", name="transform")
+        .run(write_jsonl("clean.jsonl"))
+    )
+
+- workers > 1 runs a stage on a thread or process pool; at most `window`
+  items are in flight, so a slow stage pushes back on the ones before it.
+- buffer=N decouples a stage from its upstream with a bounded queue filled
+  by a background thread (utils.out_of_core.prefetch).
+- Every stage counts items in/out and busy time; see Pipeline.stats().
+"""
+from __future__ import annotations
+
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+
+try:
+    import cloudpickle
+except ImportError:
+    from joblib.externals import cloudpickle
+
+from utils.out_of_core import prefetch
+
+
+class _Skip:
+    """Marker for a filtered-out item. Unpickles to the module's singleton, so identity
+    checks still work on results that come back from process workers."""
+    def __reduce__(self) -> str:
+        return "_SKIP"
+
+    def __repr__(self) -> str:
+        return "_SKIP"
+
+
+_SKIP = _Skip()
+
+
+@dataclass
+class StageStats:
+    """Per-stage counters, updated as items flow."""
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    busy_seconds: float = 0.0
+    started: float | None = None
+    finished: float | None = None
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Items out per second of wall time."""
+        return self.items_out / self.wall_seconds if self.wall_seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.name:<12} in={self.items_in:<9,} out={self.items_out:<9,} "
+                f"busy={self.busy_seconds:.2f}s  {self.throughput:,.0f} items/s")
+
+
+def _apply(kind: str, func: Callable[[Any], Any], item: Any) -> Any:
+    """Result of one item through a stage: a value, _SKIP (filtered out) or a list (flat_map)."""
+    if kind == "map":
+        return func(item)
+    if kind == "filter":
+        return item if func(item) else _SKIP
+    return list(func(item))
+
+
+def _apply_chunk(kind: str, func_bytes: bytes, items: list[Any]) -> list[Any]:
+    """Process-pool task: a chunk of items, so the function is unpickled once per chunk."""
+    func = cloudpickle.loads(func_bytes)
+    return [_apply(kind, func, item) for item in items]
+
+
+@dataclass
+class _Stage:
+    kind: str
+    func: Callable[[Any], Any]
+    stats: StageStats
+    workers: int = 1
+    mode: str = "thread"
+    window: int | None = None
+    chunksize: int = 64
+    buffer: int = 0
+
+    def _emit(self, result: Any) -> Iterator[Any]:
+        if result is _SKIP:
+            return
+        if self.kind == "flat_map":
+            self.stats.items_out += len(result)
+            yield from result
+        else:
+            self.stats.items_out += 1
+            yield result
+
+    def run(self, upstream: Iterable[Any]) -> Iterator[Any]:
+        if self.buffer:
+            upstream = prefetch(upstream, self.buffer)
+        self.stats.started = time.perf_counter()
+        try:
+            if self.workers <= 1:
+                yield from self._serial(upstream)
+            elif self.mode == "process":
+                yield from self._process(upstream)
+            else:
+                yield from self._threaded(upstream)
+        finally:
+            self.stats.finished = time.perf_counter()
+
+    def _serial(self, upstream: Iterable[Any]) -> Iterator[Any]:
+        for item in upstream:
+            self.stats.items_in += 1
+            start = time.perf_counter()
+            result = _apply(self.kind, self.func, item)
+            self.stats.busy_seconds += time.perf_counter() - start
+            yield from self._emit(result)
+
+    def _timed(self, item: Any) -> tuple[Any, float]:
+        start = time.perf_counter()
+        return _apply(self.kind, self.func, item), time.perf_counter() - start
+
+    def _threaded(self, upstream: Iterable[Any]) -> Iterator[Any]:
+        window = self.window or self.workers * 4
+        with ThreadPoolExecutor(self.workers, thread_name_prefix=self.stats.name) as pool:
+            pending: deque = deque()
+            for item in upstream:
+                self.stats.items_in += 1
+                pending.append(pool.submit(self._timed, item))
+                if len(pending) >= window:
+                    result, busy = pending.popleft().result()
+                    self.stats.busy_seconds += busy
+                    yield from self._emit(result)
+            while pending:
+                result, busy = pending.popleft().result()
+                self.stats.busy_seconds += busy
+                yield from self._emit(result)
+
+    def _process(self, upstream: Iterable[Any]) -> Iterator[Any]:
+        window = self.window or self.workers * 2
+        func_bytes = cloudpickle.dumps(self.func)
+        with ProcessPoolExecutor(self.workers) as pool:
+            pending: deque = deque()
+
+            def drain_one() -> Iterator[Any]:
+                start = time.perf_counter()
+                results = pending.popleft().result()
+                self.stats.busy_seconds += time.perf_counter() - start
+                for result in results:
+                    yield from self._emit(result)
+
+            chunk: list[Any] = []
+            for item in upstream:
+                self.stats.items_in += 1
+                chunk.append(item)
+                if len(chunk) >= self.chunksize:
+                    pending.append(pool.submit(_apply_chunk, self.kind, func_bytes, chunk))
+                    chunk = []
+                    if len(pending) >= window:
+                        yield from drain_one()
+            if chunk:
+                pending.append(pool.submit(_apply_chunk, self.kind, func_bytes, chunk))
+            while pending:
+                yield from drain_one()
+
+
+class Pipeline:
+    """
+    Lazy chain of stages over a source iterable. Iterate it, or call run(sink).
+    Stages run when items are pulled, so nothing happens until then.
+    """
+    def __init__(self, source: Iterable[Any], name: str = "source") -> None:
+        self.source = source
+        self.source_stats = StageStats(name)
+        self.stages: list[_Stage] = []
+
+    def _add(self, kind: str, func: Callable[[Any], Any], name: str | None, **options: Any) -> Pipeline:
+        if options.get("mode", "thread") not in ("thread", "process"):
+            raise ValueError("mode must be 'thread' or 'process'")
+        stage_name = name or getattr(func, "__name__", kind)
+        self.stages.append(_Stage(kind, func, StageStats(stage_name), **options))
+        return self
+
+    def map(self, func: Callable[[Any], Any], name: str | None = None, workers: int = 1, mode: str = "thread",
+            window: int | None = None, chunksize: int = 64, buffer: int = 0) -> Pipeline:
+        """Transform each item. Parallel stages keep input order."""
+        return self._add("map", func, name, workers=workers, mode=mode, window=window, chunksize=chunksize, buffer=buffer)
+
+    def filter(self, predicate: Callable[[Any], bool], name: str | None = None, workers: int = 1, mode: str = "thread",
+               window: int | None = None, chunksize: int = 64, buffer: int = 0) -> Pipeline:
+        """Keep items for which predicate(item) is true."""
+        return self._add("filter", predicate, name, workers=workers, mode=mode, window=window, chunksize=chunksize, buffer=buffer)
+
+    def flat_map(self, func: Callable[[Any], Iterable[Any]], name: str | None = None, workers: int = 1,
+                 mode: str = "thread", window: int | None = None, chunksize: int = 64, buffer: int = 0) -> Pipeline:
+        """Replace each item with zero or more items."""
+        return self._add("flat_map", func, name, workers=workers, mode=mode, window=window, chunksize=chunksize, buffer=buffer)
+
+    def _counted_source(self) -> Iterator[Any]:
+        stats = self.source_stats
+        stats.started = time.perf_counter()
+        iterator = iter(self.source)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items_in += 1
+                stats.items_out += 1
+                yield item
+        finally:
+            stats.finished = time.perf_counter()
+
+    def __iter__(self) -> Iterator[Any]:
+        stream: Iterable[Any] = self._counted_source()
+        for stage in self.stages:
+            stream = stage.run(stream)
+        return iter(stream)
+
+    def run(self, sink: Callable[[Iterable[Any]], Any] | None = None) -> Any:
+        """Drain the pipeline into sink (default: count items). Returns the sink's result."""
+        return (sink or count)(iter(self))
+
+    def stats(self) -> list[StageStats]:
+        return [self.source_stats] + [stage.stats for stage in self.stages]
+
+    def report(self) -> str:
+        return "\n".join(str(s) for s in self.stats())
+
+
+# =========================
+# SOURCES
+# =========================
+def read_lines(path: str) -> Iterator[str]:
+    """Lines without trailing newlines, read lazily."""
+    with open(path) as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def read_csv_rows(path: str) -> Iterator[dict[str, str]]:
+    """CSV rows as dicts (csv.DictReader), one at a time."""
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path: str) -> Iterator[Any]:
+    for line in read_lines(path):
+        if line.strip():
+            yield json.loads(line)
+
+
+# =========================
+# SINKS
+# =========================
+def count(items: Iterable[Any]) -> int:
+    n = 0
+    for _ in items:
+        n += 1
+    return n
+
+
+def to_list(items: Iterable[Any]) -> list[Any]:
+    return list(items)
+
+
+def write_jsonl(path: str) -> Callable[[Iterable[Any]], int]:
+    """Sink that writes one JSON document per line and returns the number written."""
+    def sink(items: Iterable[Any]) -> int:
+        n = 0
+        with open(path, "w") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+                n += 1
+        return n
+    return sink
+
+
+def write_csv(path: str, fieldnames: list[str]) -> Callable[[Iterable[dict[str, Any]]], int]:
+    """Sink that writes dict items as CSV rows and returns the number written."""
+    def sink(items: Iterable[dict[str, Any]]) -> int:
+        n = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for item in items:
+                writer.writerow(item)
+                n += 1
+        return n
+    return sink
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    raw, clean = os.path.join(tmp, "events.jsonl"), os.path.join(tmp, "clean.csv")
+    with open(raw, "w") as f:
+        for i in range(200_000):
+            f.write(json.dumps({"id": i, "status": random.choice(["ok", "error"]), "value": random.random()}) + "\n")
+
+    def enrich(event: dict[str, Any]) -> dict[str, Any]:
+        return {**event, "score": round(event["value"] * 100, 1)}
+
+    pipeline = (
+        Pipeline(read_lines(raw), name="read")
+        .map(json.loads, name="parse")
+        .filter(lambda e: e["status"] == "ok", name="filter")
+        .map(enrich, name="transform", workers=2, mode="process", chunksize=1000)
+    )
+    written = pipeline.run(write_csv(clean, ["id", "score"]))
+    print(f"wrote {written:,} rows")
+    print(pipeline.report())
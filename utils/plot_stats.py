@@ -0,0 +1,194 @@
+"""
+plot_stats.py
+-------------
+Compute the statistics behind seaborn plots once, then draw from the aggregates.
+
+seaborn recomputes group-by counts, bootstrap confidence intervals, pivots and
+KDEs from the raw rows on every draw. Here each statistic is computed once per
+(dataset content, plot parameters) and kept in an LRU cache; the draw
+functions only render the small aggregate. Changing a title, theme or palette
+redraws without touching the statistics.
+
+    countplot(titanic, x="class", hue="sex")            # like sns.countplot
+    barplot(car_crashes, x="total", y="abbrev", orient="h")
+    heatmap(flights, index="month", columns="year", values="passengers", annot=True, fmt="d")
+    histplot(df, x="A", kde=True)
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from utils.fingerprint import fingerprint
+
+BOOT_BATCH_ELEMENTS = 2**22
+
+
+class PlotStatsCache:
+    """
+    LRU cache of plot aggregates keyed by (statistic, frame fingerprint, parameters).
+    Safe to share between Streamlit script threads; statistics are computed outside the lock.
+    """
+    def __init__(self, max_entries: int = 128) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, df: pd.DataFrame, compute: Callable[[], Any], **params: Any) -> Any:
+        # Only the columns the statistic reads take part in the key.
+        columns = [c for c in dict.fromkeys(v for v in params.values() if isinstance(v, str)) if c in df.columns]
+        key = f"{kind}:{fingerprint(df[columns] if columns else df, params)}"
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache: PlotStatsCache | None = None
+
+
+def default_cache() -> PlotStatsCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PlotStatsCache()
+    return _default_cache
+
+
+def _levels(series: pd.Series) -> list[Any]:
+    """Category order as seaborn uses it: categorical order, else order of appearance."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories)
+    return list(pd.unique(series.dropna()))
+
+
+# =========================
+# STATISTICS
+# =========================
+def count_stats(df: pd.DataFrame, x: str, hue: str | None = None) -> pd.DataFrame:
+    """Counts with one row per x level and one column per hue level."""
+    if hue is None:
+        counts = df[x].value_counts().reindex(_levels(df[x]), fill_value=0).to_frame("count")
+    else:
+        counts = pd.crosstab(df[x], df[hue]).reindex(index=_levels(df[x]), columns=_levels(df[hue]), fill_value=0)
+    return counts
+
+
+def bar_stats(df: pd.DataFrame, category: str, value: str, ci: float = 95, n_boot: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Mean of value per category with a bootstrap confidence interval (seaborn's default errorbar)."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for level in _levels(df[category]):
+        values = df.loc[df[category] == level, value].dropna().to_numpy(dtype=float)
+        if len(values) == 0:
+            rows.append((level, np.nan, np.nan, np.nan))
+            continue
+        # Resample in batches: one (n_boot, n) index matrix is ~8 GB for a million rows.
+        batch = max(BOOT_BATCH_ELEMENTS // len(values), 1)
+        boots = np.concatenate([
+            values[rng.integers(0, len(values), size=(min(batch, n_boot - start), len(values)))].mean(axis=1)
+            for start in range(0, n_boot, batch)
+        ])
+        low, high = np.percentile(boots, [(100 - ci) / 2, 100 - (100 - ci) / 2])
+        rows.append((level, values.mean(), low, high))
+    return pd.DataFrame(rows, columns=[category, "estimate", "low", "high"])
+
+
+def pivot_stats(df: pd.DataFrame, index: str, columns: str, values: str) -> pd.DataFrame:
+    return df.pivot(index=index, columns=columns, values=values)
+
+
+def hist_stats(df: pd.DataFrame, x: str, bins: int | str = "auto", kde: bool = False, gridsize: int = 200) -> dict[str, np.ndarray]:
+    """Histogram counts and edges, plus a KDE curve scaled to counts (as histplot draws it)."""
+    values = df[x].dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(values, bins=bins)
+    stats = {"counts": counts, "edges": edges}
+    if kde and len(values) > 1:
+        from scipy.stats import gaussian_kde
+        grid = np.linspace(values.min(), values.max(), gridsize)
+        density = gaussian_kde(values)(grid)
+        stats["kde_x"] = grid
+        stats["kde_y"] = density * len(values) * np.diff(edges).mean()
+    return stats
+
+
+# =========================
+# RENDERERS
+# =========================
+def countplot(df: pd.DataFrame, x: str, hue: str | None = None, ax: Any = None, cache: PlotStatsCache | None = None) -> Any:
+    cache = cache or default_cache()
+    counts = cache.get("count", df, lambda: count_stats(df, x, hue), x=x, hue=hue)
+    ax = ax or plt.gca()
+    positions = np.arange(len(counts.index))
+    width = 0.8 / len(counts.columns)
+    for i, column in enumerate(counts.columns):
+        offset = (i - (len(counts.columns) - 1) / 2) * width
+        ax.bar(positions + offset, counts[column], width, label=None if hue is None else str(column), color=f"C{i}")
+    ax.set_xticks(positions, [str(level) for level in counts.index])
+    ax.set_xlabel(x)
+    ax.set_ylabel("count")
+    if hue is not None:
+        ax.legend(title=hue)
+    return ax
+
+
+def barplot(df: pd.DataFrame, x: str, y: str, orient: str = "v", ax: Any = None, cache: PlotStatsCache | None = None) -> Any:
+    """orient="v": categories on x, values on y; orient="h": values on x, categories on y (as in sns.barplot)."""
+    cache = cache or default_cache()
+    category, value = (x, y) if orient == "v" else (y, x)
+    stats = cache.get("bar", df, lambda: bar_stats(df, category, value), category=category, value=value)
+    ax = ax or plt.gca()
+    positions = np.arange(len(stats))
+    errors = np.vstack([stats["estimate"] - stats["low"], stats["high"] - stats["estimate"]])
+    labels = [str(level) for level in stats[category]]
+    if orient == "v":
+        ax.bar(positions, stats["estimate"], yerr=errors, color="C0")
+        ax.set_xticks(positions, labels)
+    else:
+        ax.barh(positions, stats["estimate"], xerr=errors, color="C0")
+        ax.set_yticks(positions, labels)
+        ax.invert_yaxis()
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return ax
+
+
+def heatmap(df: pd.DataFrame, index: str, columns: str, values: str, ax: Any = None,
+            cache: PlotStatsCache | None = None, **heatmap_kws: Any) -> Any:
+    """sns.heatmap of df.pivot(index, columns, values), with the pivot cached."""
+    import seaborn as sns
+    cache = cache or default_cache()
+    table = cache.get("pivot", df, lambda: pivot_stats(df, index, columns, values), index=index, columns=columns, values=values)
+    return sns.heatmap(table, ax=ax, **heatmap_kws)
+
+
+def histplot(df: pd.DataFrame, x: str, bins: int | str = "auto", kde: bool = False, ax: Any = None,
+             cache: PlotStatsCache | None = None) -> Any:
+    cache = cache or default_cache()
+    stats = cache.get("hist", df, lambda: hist_stats(df, x, bins, kde), x=x, bins=bins, kde=kde)
+    ax = ax or plt.gca()
+    edges = stats["edges"]
+    ax.bar(edges[:-1], stats["counts"], width=np.diff(edges), align="edge", color="C0", alpha=0.6, edgecolor="white")
+    if "kde_x" in stats:
+        ax.plot(stats["kde_x"], stats["kde_y"], color="C0")
+    ax.set_xlabel(x)
+    ax.set_ylabel("Count")
+    return ax
@@ -0,0 +1,157 @@
+"""
+prediction_service.py
+---------------------
+Serve a fitted model to many concurrent callers with micro-batching.
+
+Each caller submits a single row. A background thread collects rows until the
+batch is full (max_batch_size) or the oldest row has waited max_wait_ms, runs
+one vectorized model.predict on the whole batch and hands each caller its own
+result. Under concurrent load the per-call Python/validation overhead of
+predict is paid once per batch instead of once per row. Rows of the wrong
+shape are rejected by submit(); if predict fails on a batch, its rows are
+retried one at a time so only the bad request fails.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any
+
+import numpy as np
+
+from utils.histogram import Histogram, exponential_buckets
+
+
+class PredictionService:
+    """
+    In-process micro-batching wrapper around model.predict (or another method).
+    Example:
+        with PredictionService(clf) as service:
+            label = service.predict(X_test[0])
+    """
+    def __init__(self, model: Any, max_batch_size: int = 64, max_wait_ms: float = 2.0, method: str = "predict") -> None:
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._predict = getattr(model, method)
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.latency = Histogram(exponential_buckets(0.0001, 2, 18))  # 0.1ms .. ~13s
+        self.batch_sizes = Histogram(exponential_buckets(1, 2, max(max_batch_size.bit_length(), 1)))
+
+    def start(self) -> PredictionService:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._serve, name="prediction-service", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> PredictionService:
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def submit(self, row: Any) -> Future:
+        """Queue one row (1-D feature vector) and return a Future for its prediction."""
+        if self._thread is None:
+            raise RuntimeError("PredictionService is not running; call start() first")
+        row = np.asarray(row)
+        n_features = getattr(self.model, "n_features_in_", None)
+        if row.ndim != 1 or (n_features is not None and row.shape[0] != n_features):
+            expected = f"({n_features},)" if n_features is not None else "a 1-D row"
+            raise ValueError(f"row has shape {row.shape}, expected {expected}")
+        future: Future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, row: Any, timeout: float | None = None) -> Any:
+        """Blocking single-row prediction."""
+        return self.submit(row).result(timeout)
+
+    def _collect(self) -> list[tuple[np.ndarray, Future, float]]:
+        try:
+            first = self._queue.get(timeout=0.05)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _serve(self) -> None:
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                results = self._predict(np.stack([row for row, _, _ in batch]))
+            except Exception:
+                # One malformed row (wrong length, a value predict rejects) must not fail the others.
+                self._serve_rows(batch)
+                continue
+            done = time.perf_counter()
+            self.batch_sizes.record(len(batch))
+            for (_, future, submitted), result in zip(batch, results):
+                future.set_result(result)
+                self.latency.record(done - submitted)
+
+    def _serve_rows(self, batch: list[tuple[np.ndarray, Future, float]]) -> None:
+        for row, future, submitted in batch:
+            try:
+                result = self._predict(row[np.newaxis])[0]
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self.batch_sizes.record(1)
+            future.set_result(result)
+            self.latency.record(time.perf_counter() - submitted)
+
+    def stats(self) -> dict[str, Any]:
+        """Latency (seconds) and batch-size summaries plus their histogram buckets."""
+        return {
+            "latency": self.latency.summary(),
+            "batch_size": self.batch_sizes.summary(),
+            "latency_buckets": self.latency.buckets(),
+            "batch_size_buckets": self.batch_sizes.buckets(),
+        }
+
+
+if __name__ == "__main__":
+    import warnings
+    from concurrent.futures import ThreadPoolExecutor
+    from sklearn.datasets import load_digits
+    from sklearn.linear_model import LogisticRegression
+
+    warnings.filterwarnings("ignore")
+    X, y = load_digits(return_X_y=True)
+    clf = LogisticRegression(max_iter=200).fit(X, y)
+    rows = np.tile(X, (3, 1))
+
+    start = time.perf_counter()
+    for row in rows:
+        clf.predict(row.reshape(1, -1))
+    naive = (time.perf_counter() - start) / len(rows)
+    print(f"row-at-a-time: {naive * 1e6:.0f} us/request")
+
+    with PredictionService(clf) as service, ThreadPoolExecutor(max_workers=64) as callers:
+        start = time.perf_counter()
+        list(callers.map(service.predict, rows))
+        batched = (time.perf_counter() - start) / len(rows)
+    print(f"micro-batched (64 concurrent callers): {batched * 1e6:.0f} us/request ({naive / batched:.1f}x)")
+    print(service.stats()["batch_size"])
+    print(service.stats()["latency"])
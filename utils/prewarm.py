@@ -0,0 +1,359 @@
+"""
+prewarm.py
+----------
+Default outputs of every topic, computed at deploy time.
+
+The practice editor opens with the topic module's own source, so what the
+first click on "Run" shows is known in advance. build_bundle() runs every
+module in basics/, core_python/ and data_science/ in parallel worker
+processes and stores, per module: the run result (stdout including the full
+text when truncated, error, timings) and the main() return value the app
+displays. A hit shows exactly what a live run shows, so figures are not
+stored: the app does not display the figures of live runs either.
+
+    python -m utils.prewarm                 # deploy step: build the bundle
+    bundle = default_bundle()               # app: load it (or build it in the background)
+    hit = bundle.lookup(user_code)          # None as soon as the code is edited
+
+Entries are keyed by bytecode_cache.source_key of the code, so an edited
+editor simply misses. The bundle lives in .cache/prewarm/<version>/ (or
+PREWARM_DIR), where the version hashes the topic sources, the repo's data
+files, the Python and library versions and BUNDLE_FORMAT; any change makes
+a new bundle.
+
+Only outputs that are a pure function of that version may be served, so a
+topic is left out of the bundle (it runs live, listed under "live" in the
+manifest with the reason) when:
+- its source calls a clock or random source (datetime.now(), time.time(),
+  np.random.*, random.*, uuid.*, ...), even seeded ones;
+- two builds in separate interpreters (different hash seeds) disagree on
+  its output or return value;
+- it failed for environmental reasons (timeouts, network access for the
+  seaborn datasets) or crashed its worker.
+Each build worker runs in its own temporary directory and each topic in its
+own scratch directory, so lessons that write sample.txt or data.csv do not
+touch the repo or each other. default_bundle() starts at most one build per
+server process. PREWARM=0 turns the app's use of the bundle off.
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import datetime
+import hashlib
+import importlib.metadata
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+
+from utils import bytecode_cache, output_capture
+from utils.broker import result_from_json
+from utils.code_runner import Kernel, RunResult, call_entry_point
+from utils.http_api import result_to_json
+from utils.scratch import data_files
+
+BUNDLE_FORMAT = 3
+DEFAULT_BUNDLE_ROOT = os.path.join(bytecode_cache.ROOT, ".cache", "prewarm")
+LIBRARIES = ("numpy", "pandas", "matplotlib", "seaborn", "scikit-learn")
+KEEP_BUNDLES = 3
+# Calls whose result differs from run to run: method names (datetime.now(), date.today(),
+# pd.Timestamp.now()) and module prefixes (time.time(), np.random.normal(), uuid.uuid4()).
+CLOCK_METHODS = ("now", "today", "utcnow")
+VOLATILE_MODULES = ("time", "random", "np.random", "numpy.random", "uuid", "secrets")
+ENABLED = os.environ.get("PREWARM", "1").lower() not in ("0", "false", "off", "no")
+
+
+def bundle_root() -> str:
+    return os.environ.get("PREWARM_DIR", DEFAULT_BUNDLE_ROOT)
+
+
+def environment() -> dict[str, str]:
+    versions = {"python": sys.version.split()[0]}
+    for name in LIBRARIES:
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = "-"
+    return versions
+
+
+def bundle_version(paths: list[str]) -> str:
+    """Hash of everything a default output depends on: the sources, the data files, the environment and the format."""
+    digest = hashlib.blake2b(json.dumps([BUNDLE_FORMAT, environment()]).encode(), digest_size=8)
+    for path in [*paths, *data_files()]:
+        digest.update(os.path.relpath(path, bytecode_cache.ROOT).encode() + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read() + b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class Prewarmed:
+    """A topic's stored default run, in the shapes the app displays."""
+    topic: str
+    result: RunResult
+    entry_point: tuple[str, str] | None
+
+
+class Bundle:
+    """A built bundle directory holding manifest.json."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.entries: dict[str, dict[str, Any]] = self.manifest["entries"]
+
+    def lookup(self, code: str) -> Prewarmed | None:
+        entry = self.entries.get(bytecode_cache.source_key(code))
+        if entry is None:
+            return None
+        return Prewarmed(entry["topic"], result_from_json(entry["result"]),
+                         tuple(entry["entry_point"]) if entry["entry_point"] else None)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _dotted(node: ast.AST) -> str:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def volatile_calls(code: str) -> list[str]:
+    """Calls in code that read a clock or a random source, e.g. ["datetime.now", "np.random.normal"]."""
+    found = []
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Call):
+            name = _dotted(node.func)
+            if name.rpartition(".")[2] in CLOCK_METHODS or any(
+                    name.startswith(module + ".") for module in VOLATILE_MODULES) and name != "time.sleep":
+                found.append(name)
+    return sorted(set(found))
+
+
+class _Timeout(TimeoutError):
+    pass
+
+
+def _alarm(signum: int, frame: Any) -> None:
+    raise _Timeout("topic took too long to prewarm")
+
+
+def _init_worker(work_root: str) -> None:
+    """Build worker set-up: a private working directory, a headless matplotlib, fd-level capture."""
+    os.chdir(tempfile.mkdtemp(prefix="worker-", dir=work_root))
+    os.environ["MPLBACKEND"] = "Agg"
+    # One topic at a time owns this process, so capturing all of fd 1 is safe.
+    output_capture.CAPTURE_FD = True
+
+
+def _run_topic(path: str, timeout: float) -> dict[str, Any]:
+    """Worker process: run one topic module the way the app's Run button does."""
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        plt = None
+    if plt is not None:
+        plt.close("all")
+    with open(path) as f:
+        code = f.read()
+    key = bytecode_cache.source_key(code)
+    signal.signal(signal.SIGALRM, _alarm)
+    signal.alarm(math.ceil(timeout))
+    entry_point = None
+    kernel = Kernel()
+    try:
+        result = kernel.run(code)
+        if result.error is None:
+            try:
+                # main() runs in the topic's scratch directory too.
+                with kernel.scratch.activate():
+                    name, value = call_entry_point(result.namespace) or (None, None)
+                entry_point = name and [name, str(value)]
+            except Exception as e:
+                result.error = e
+    except _Timeout as e:
+        result = RunResult("", e, {})
+    finally:
+        signal.alarm(0)
+        kernel.close()
+    if plt is not None:
+        plt.close("all")
+    data = result_to_json(result, full_output=True)
+    if result.output is not None:
+        result.output.close()
+    return {
+        "topic": os.path.relpath(path, bytecode_cache.ROOT),
+        "key": key,
+        # Timeouts and failed downloads say nothing about the code: run those topics live.
+        "transient": isinstance(result.error, OSError),
+        "result": data,
+        "entry_point": entry_point,
+    }
+
+
+def _signature(entry: dict[str, Any]) -> Any:
+    """What the learner would see, without timings: two builds must agree on it."""
+    result = {k: v for k, v in entry["result"].items() if k != "seconds"}
+    return result, entry["entry_point"]
+
+
+def _build_pass(paths: list[str], work_root: str, workers: int,
+                timeout: float) -> tuple[dict[str, dict[str, Any]], dict[str, str]]:
+    """Run every topic once in fresh interpreters; (entries by topic, failures by topic)."""
+    entries: dict[str, dict[str, Any]] = {}
+    failed: dict[str, str] = {}
+    # spawn: each pass gets new interpreters, hence new string hash seeds (set ordering).
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(work_root,)) as pool:
+        futures = {pool.submit(_run_topic, path, timeout): path for path in paths}
+        for future in as_completed(futures):
+            topic = os.path.relpath(futures[future], bytecode_cache.ROOT)
+            try:
+                entries[topic] = future.result()
+            except Exception as e:   # the worker died (os._exit, segfault) or the result did not pickle
+                failed[topic] = f"{type(e).__name__}: {e}"
+    return entries, failed
+
+
+def _prune(root: str, keep: str) -> None:
+    """Delete all but the KEEP_BUNDLES newest bundles (other app versions may still use recent ones)."""
+    bundles = sorted((e for e in os.scandir(root) if e.is_dir() and not e.name.startswith(".")),
+                     key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in bundles[KEEP_BUNDLES:]:
+        if entry.name != keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def build_bundle(
+    dirs: tuple[str, ...] = bytecode_cache.TOPIC_DIRS,
+    root: str | None = None,
+    workers: int | None = None,
+    timeout: float = 120.0,
+    force: bool = False,
+) -> Bundle:
+    """Run every topic module in parallel and store the bundle; reuse an existing one unless force."""
+    root = root or bundle_root()
+    paths = bytecode_cache.topic_files(dirs)
+    version = bundle_version(paths)
+    final = os.path.join(root, version)
+    if os.path.exists(os.path.join(final, "manifest.json")) and not force:
+        return Bundle(final)
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{version}-", dir=root)
+    work_root = os.path.join(staging, ".work")
+    os.makedirs(work_root)
+    start = time.perf_counter()
+    entries: dict[str, dict[str, Any]] = {}
+    live: dict[str, str] = {}
+    try:
+        workers = workers or min(len(paths), os.cpu_count() or 1) or 1
+        first, failed = _build_pass(paths, work_root, workers, timeout)
+        second, failed_again = _build_pass(paths, work_root, workers, timeout)
+        for path in paths:
+            topic = os.path.relpath(path, bytecode_cache.ROOT)
+            with open(path) as f:
+                volatile = volatile_calls(f.read())
+            entry, check = first.get(topic), second.get(topic)
+            if topic in failed or topic in failed_again:
+                live[topic] = failed.get(topic) or failed_again[topic]
+            elif entry["transient"] or check["transient"]:
+                error = (entry if entry["transient"] else check)["result"]["error"]
+                live[topic] = f"{error['type']}: {error['message']}"
+            elif volatile:
+                live[topic] = "reads a clock or random source: " + ", ".join(volatile)
+            elif _signature(entry) != _signature(check):
+                live[topic] = "output differs between two builds"
+            else:
+                entries[entry["key"]] = {k: v for k, v in entry.items() if k not in ("key", "transient")}
+        shutil.rmtree(work_root, ignore_errors=True)
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "version": version,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "environment": environment(),
+            "build_seconds": round(time.perf_counter() - start, 3),
+            "entries": entries,
+            "live": live,
+        }
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        if force:
+            shutil.rmtree(final, ignore_errors=True)
+        try:
+            os.rename(staging, final)
+        except OSError:
+            # Another process finished the same version first; its bundle is equivalent.
+            shutil.rmtree(staging, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _prune(root, version)
+    return Bundle(final)
+
+
+_default_bundle: Bundle | None = None
+_build_started = False
+_build_lock = threading.Lock()
+
+
+def default_bundle(background: bool = True) -> Bundle | None:
+    """
+    The bundle for the current sources and environment. If it has not been built
+    yet, the first call builds it (in a background thread unless background=False)
+    and None is returned until it is ready. None as well when PREWARM=0.
+    """
+    global _default_bundle, _build_started
+    if _default_bundle is not None or not ENABLED:
+        return _default_bundle
+    # Sessions call this concurrently: only the first may start the (expensive) build.
+    with _build_lock:
+        if _build_started:
+            return _default_bundle
+        _build_started = True
+
+    def work() -> None:
+        global _default_bundle
+        try:
+            _default_bundle = build_bundle()
+        except Exception as e:
+            print(f"prewarm: bundle build failed: {e}", file=sys.stderr)
+
+    paths = bytecode_cache.topic_files()
+    path = os.path.join(bundle_root(), bundle_version(paths))
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        _default_bundle = Bundle(path)
+    elif background:
+        threading.Thread(target=work, daemon=True, name="prewarm-bundle").start()
+    else:
+        work()
+    return _default_bundle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every topic module and store its default output")
+    parser.add_argument("--workers", type=int, help="parallel processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per topic")
+    parser.add_argument("--force", action="store_true", help="rebuild even if this version exists")
+    args = parser.parse_args()
+    bundle = build_bundle(workers=args.workers, timeout=args.timeout, force=args.force)
+    manifest = bundle.manifest
+    print(f"bundle {bundle.version} at {bundle.path}: {len(bundle)} topics in {manifest['build_seconds']:.1f}s")
+    for topic, reason in sorted(manifest["live"].items()):
+        print(f"  runs live: {topic}: {reason}")
@@ -0,0 +1,256 @@
+"""
+profiling.py
+------------
+Instrumentation decorators: the production version of simple_decorator.
+
+simple_decorator in basics/decorators_generators.py prints around every call.
+These decorators measure instead, aggregating into histograms per function:
+
+    @profile()                          # call count + wall and CPU time
+    def load(...): ...
+
+    @profile(sample_every=100, memory=True)   # 1-in-100 calls, incl. tracemalloc
+    def parse(...): ...
+
+    print(report())                     # or export_json(path) / log_metrics()
+
+Overhead when disabled:
+- PROFILING=0 in the environment at import time: decorators return the
+  original function unchanged, so the cost is exactly zero.
+- disable() at run time: each call pays one global flag check.
+Sampled calls skip timing entirely on the other N-1 calls.
+
+CPU time is per thread (time.thread_time), so concurrent sessions do not
+inflate each other. tracemalloc runs while at least one memory-profiled call
+is active and stops with the last one (unless it was already on); nested
+calls each get their own peak. The peak is process-wide, so allocations by
+other threads during the call are counted too.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from utils.histogram import Histogram, exponential_buckets
+
+_ENV_ENABLED = os.environ.get("PROFILING", "1").lower() not in ("0", "false", "off", "no")
+_enabled = _ENV_ENABLED
+_lock = threading.Lock()
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_started = False
+_trace_frames = threading.local()
+
+TIME_BUCKETS = exponential_buckets(1e-6, 2, 28)   # 1us .. ~2 min
+BYTE_BUCKETS = exponential_buckets(64, 2, 26)     # 64 B .. ~2 GB
+
+
+@dataclass
+class FunctionMetrics:
+    """Everything recorded for one decorated function."""
+    name: str
+    calls: int = 0
+    sampled: int = 0
+    errors: int = 0
+    wall: Histogram = field(default_factory=lambda: Histogram(TIME_BUCKETS))
+    cpu: Histogram = field(default_factory=lambda: Histogram(TIME_BUCKETS))
+    allocated: Histogram = field(default_factory=lambda: Histogram(BYTE_BUCKETS))
+
+    def as_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"name": self.name, "calls": self.calls, "sampled": self.sampled, "errors": self.errors}
+        for key in ("wall", "cpu", "allocated"):
+            hist = getattr(self, key)
+            if hist.count:
+                data[key] = hist.summary()
+        return data
+
+
+_registry: dict[str, FunctionMetrics] = {}
+
+
+def metrics(name: str) -> FunctionMetrics:
+    with _lock:
+        if name not in _registry:
+            _registry[name] = FunctionMetrics(name)
+        return _registry[name]
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    with _lock:
+        _registry.clear()
+
+
+def _trace_enter() -> list[int]:
+    """Start measuring allocations for one call; returns its [base, peak] frame."""
+    global _trace_users, _trace_started
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _trace_started = True
+        _trace_users += 1
+    stack = _trace_frames.__dict__.setdefault("stack", [])
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        # reset_peak() hides the enclosing call's peak so far: hand it over first.
+        stack[-1][1] = max(stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    frame = [current, current]
+    stack.append(frame)
+    return frame
+
+
+def _trace_exit(frame: list[int]) -> int:
+    """Bytes allocated at peak during the call; stops tracemalloc after the last user if we started it."""
+    global _trace_users, _trace_started
+    peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+    stack = _trace_frames.stack
+    stack.pop()
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_started:
+            # Trace only while profiled calls run: leaving it on slows every allocation in the process.
+            tracemalloc.stop()
+            _trace_started = False
+    return max(peak - frame[0], 0)
+
+
+def profile(
+    name: str | None = None,
+    sample_every: int = 1,
+    wall: bool = True,
+    cpu: bool = True,
+    memory: bool = False,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Count every call; on 1-in-sample_every calls record wall/CPU time and,
+    with memory=True, the bytes allocated (tracemalloc peak) during the call.
+    """
+    if sample_every < 1:
+        raise ValueError("sample_every must be >= 1")
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        if not _ENV_ENABLED:
+            return func
+        m = metrics(name or f"{func.__module__}.{func.__qualname__}")
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _lock:
+                m.calls += 1
+                sampled = m.calls % sample_every == 0
+                if sampled:
+                    m.sampled += 1
+            if not sampled:
+                return func(*args, **kwargs)
+            frame = _trace_enter() if memory else None
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                with _lock:
+                    m.errors += 1
+                raise
+            finally:
+                if wall:
+                    m.wall.record(time.perf_counter() - wall_start)
+                if cpu:
+                    m.cpu.record(time.thread_time() - cpu_start)
+                if frame is not None:
+                    m.allocated.record(_trace_exit(frame))
+        return wrapper
+    return decorator
+
+
+def timed(func: Callable[..., Any]) -> Callable[..., Any]:
+    """@timed: wall and CPU time of every call."""
+    return profile()(func)
+
+
+def count_calls(func: Callable[..., Any]) -> Callable[..., Any]:
+    """@count_calls: only counts calls (no timing)."""
+    return profile(wall=False, cpu=False)(func)
+
+
+def track_allocations(func: Callable[..., Any]) -> Callable[..., Any]:
+    """@track_allocations: peak bytes allocated per call, via tracemalloc."""
+    return profile(wall=False, cpu=False, memory=True)(func)
+
+
+def snapshot() -> list[dict[str, Any]]:
+    with _lock:
+        return [m.as_dict() for m in _registry.values()]
+
+
+def report() -> str:
+    """Plain-text table of every instrumented function, slowest (p95 wall) first."""
+    rows = sorted(snapshot(), key=lambda d: d.get("wall", {}).get("p95", 0), reverse=True)
+    lines = [f"{'function':<45} {'calls':>9} {'sampled':>8} {'wall p50':>10} {'wall p95':>10} {'cpu mean':>10} {'alloc p95':>10}"]
+    for row in rows:
+        wall, cpu, alloc = row.get("wall", {}), row.get("cpu", {}), row.get("allocated", {})
+        lines.append(
+            f"{row['name'][-45:]:<45} {row['calls']:>9,} {row['sampled']:>8,} "
+            f"{wall.get('p50', 0) * 1e3:>8.2f}ms {wall.get('p95', 0) * 1e3:>8.2f}ms "
+            f"{cpu.get('mean', 0) * 1e3:>8.2f}ms {alloc.get('p95', 0) / 1024:>8.1f}KB"
+        )
+    return "\n".join(lines)
+
+
+def export_json(path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def log_metrics(logger: logging.Logger | None = None) -> None:
+    """Write one JSON line per function to the telemetry logger."""
+    logger = logger or logging.getLogger("telemetry")
+    for row in snapshot():
+        logger.info(json.dumps(row))
+
+
+if __name__ == "__main__":
+    import timeit
+
+    def plain(x: int) -> int:
+        return x + 1
+
+    @profile()
+    def instrumented(x: int) -> int:
+        return x + 1
+
+    @profile(sample_every=100, memory=True)
+    def sampled(n: int) -> list[int]:
+        return list(range(n))
+
+    for i in range(10_000):
+        instrumented(i)
+        sampled(1000)
+    print(report())
+
+    n = 200_000
+    base = timeit.timeit(lambda: plain(1), number=n)
+    on = timeit.timeit(lambda: instrumented(1), number=n)
+    disable()
+    off = timeit.timeit(lambda: instrumented(1), number=n)
+    print(f"per-call overhead: enabled {(on - base) / n * 1e9:.0f} ns, disabled {(off - base) / n * 1e9:.0f} ns")
@@ -0,0 +1,131 @@
+"""
+scratch.py
+----------
+Per-run scratch directories, so file I/O lessons never touch the repo.
+
+basics/file_io.py, basics/context_managers.py and core_01_basics.py write
+sample.txt / sample.json into the working directory, and core_02_advanced.py
+overwrites data.csv. Run concurrently from the app, they race on the same
+files. A Scratch is a private directory on RAM-backed tmpfs (/dev/shm when
+available, so nothing is fsynced to disk) seeded with copies of the repo's
+data files; code runs with it as the working directory and the whole tree
+is removed in one go afterwards:
+
+    scratch = Scratch()
+    with scratch.activate():
+        exec(code, namespace)      # open("data.csv", "w") writes the copy
+    scratch.close()
+
+The app serves every session from a thread of one process, and os.chdir
+would move all of them. On Linux, activate() first gives the calling thread
+its own filesystem context (unshare(CLONE_FS)), so the chdir applies to
+that thread (and threads it starts) only; concurrent runs neither wait for
+each other nor see each other's directory. Where that is unavailable the
+working directory is left alone, and only the scratch.open overlay that
+Kernel installs as the namespace's open() resolves relative paths.
+"""
+from __future__ import annotations
+
+import contextlib
+import ctypes
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import Any, Iterator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_SUFFIXES = (".csv", ".json", ".txt")
+EXCLUDED = ("requirements.txt",)
+
+CLONE_FS = 0x200
+
+_thread_state = threading.local()
+
+
+def default_root() -> str:
+    """SCRATCH_DIR if set, else tmpfs (/dev/shm) when available, else the system temp dir."""
+    root = os.environ.get("SCRATCH_DIR")
+    if root:
+        return root
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm/mpds-scratch"
+    return os.path.join(tempfile.gettempdir(), "mpds-scratch")
+
+
+def private_cwd() -> bool:
+    """
+    Give the calling thread its own working directory (Linux unshare(CLONE_FS)).
+    Done once per thread; False where the platform does not support it.
+    """
+    private = getattr(_thread_state, "private_cwd", None)
+    if private is None:
+        private = False
+        if sys.platform.startswith("linux"):
+            try:
+                private = ctypes.CDLL(None, use_errno=True).unshare(CLONE_FS) == 0
+            except (OSError, AttributeError):
+                pass
+        _thread_state.private_cwd = private
+    return private
+
+
+def data_files(directory: str = ROOT) -> list[str]:
+    """The lesson data files in the repo root (data.csv, data.json, sample.txt, ...)."""
+    return sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.endswith(DATA_SUFFIXES) and f not in EXCLUDED and os.path.isfile(os.path.join(directory, f))
+    )
+
+
+class Scratch:
+    """A private working directory seeded with copies of the repo data files."""
+    def __init__(self, root: str | None = None, seed: list[str] | None = None) -> None:
+        self.root = root or default_root()
+        self.seed = data_files() if seed is None else seed
+        self.path: str | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard everything written so far and start again from the seed files."""
+        self.close()
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="run-", dir=self.root)
+        for source in self.seed:
+            # Copies, not links: writing through a link would modify the repo file.
+            shutil.copyfile(source, os.path.join(self.path, os.path.basename(source)))
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator[str]:
+        """Make this directory the calling thread's working directory for the duration of the block."""
+        if self.path is None:
+            raise RuntimeError("scratch directory is closed")
+        if not private_cwd():
+            yield self.path
+            return
+        previous = os.getcwd()
+        os.chdir(self.path)
+        try:
+            yield self.path
+        finally:
+            os.chdir(previous)
+
+    def open(self, file: Any, *args: Any, **kwargs: Any) -> Any:
+        """Builtin open() with relative paths resolved inside this directory."""
+        if isinstance(file, (str, bytes, os.PathLike)) and not os.path.isabs(file):
+            if self.path is None:
+                raise RuntimeError("scratch directory is closed")
+            file = os.path.join(os.fsencode(self.path) if isinstance(file, bytes) else self.path, file)
+        return open(file, *args, **kwargs)
+
+    def close(self) -> None:
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def __enter__(self) -> Scratch:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
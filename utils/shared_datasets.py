@@ -0,0 +1,250 @@
+"""
+shared_datasets.py
+------------------
+Load a dataset once and share it with every worker process without copying.
+
+Arrays and DataFrame columns are written as ``.npy`` files into a RAM-backed
+directory (``/dev/shm`` where available) and reopened with ``np.load(mmap_mode=...)``.
+Every process that opens the same dataset maps the same physical pages, so a
+pool of N workers holds one copy of the data instead of N.
+
+Views are copy-on-write by default: a worker may modify its view, but the
+touched pages are copied privately and the shared files never change.
+"""
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = "manifest.json"
+# Object columns are pickled in blocks of this many rows, so a worker loading a row range
+# unpickles only the blocks it needs.
+PICKLE_CHUNK_ROWS = 65_536
+
+
+def default_root() -> str:
+    """
+    Directory that holds shared datasets.
+    Override with the SHARED_DATASETS_DIR environment variable.
+    """
+    env = os.environ.get("SHARED_DATASETS_DIR")
+    if env:
+        return env
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "mpds-datasets")
+
+
+@dataclass(frozen=True)
+class SharedDataset:
+    """
+    Picklable handle to a published dataset.
+    Send it to worker processes and call load() there to get zero-copy views.
+    """
+    name: str
+    root: str
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, self.name)
+
+    def load(self, readonly: bool = False, rows: slice | None = None) -> Any:
+        """
+        Open the dataset as memory-mapped views.
+        readonly=True raises on writes; the default maps pages copy-on-write.
+        rows selects a contiguous row range (e.g. one worker's share of a frame).
+        """
+        mode = "r" if readonly else "c"
+        with open(os.path.join(self.path, MANIFEST)) as f:
+            manifest = json.load(f)
+        kind = manifest["kind"]
+        rows = rows or slice(None)
+        if kind == "array":
+            return _load_array(self.path, "data", mode)[rows]
+        if kind == "tuple":
+            return tuple(_load_array(self.path, f"item{i}", mode)[rows] for i in range(manifest["length"]))
+        return _load_frame(self.path, manifest, mode, rows)
+
+    def nbytes(self) -> int:
+        """Size of the shared files on disk (or in RAM for /dev/shm)."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.path))
+
+
+class SharedDatasetStore:
+    """
+    Publish datasets once (in the parent process) and hand out SharedDataset handles.
+    Publishing is atomic, so concurrent publishers of the same name are safe.
+    """
+    def __init__(self, root: str | None = None) -> None:
+        self.root = root or default_root()
+        os.makedirs(self.root, exist_ok=True)
+
+    def get(self, name: str) -> SharedDataset | None:
+        """Return the handle for an already published dataset, or None."""
+        handle = SharedDataset(name, self.root)
+        if os.path.exists(os.path.join(handle.path, MANIFEST)):
+            return handle
+        return None
+
+    def publish(self, name: str, data: Any, overwrite: bool = False) -> SharedDataset:
+        """
+        Write an ndarray, a tuple of ndarrays (e.g. X, y) or a DataFrame to the store.
+        """
+        existing = self.get(name)
+        if existing is not None and not overwrite:
+            return existing
+        staging = os.path.join(self.root, f".{name}.{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            if isinstance(data, pd.DataFrame):
+                manifest = _save_frame(staging, data)
+            elif isinstance(data, (tuple, list)):
+                for i, item in enumerate(data):
+                    np.save(os.path.join(staging, f"item{i}.npy"), np.asarray(item))
+                manifest = {"kind": "tuple", "length": len(data)}
+            else:
+                np.save(os.path.join(staging, "data.npy"), np.asarray(data))
+                manifest = {"kind": "array"}
+            with open(os.path.join(staging, MANIFEST), "w") as f:
+                json.dump(manifest, f)
+            handle = SharedDataset(name, self.root)
+            if overwrite and existing is not None:
+                shutil.rmtree(handle.path, ignore_errors=True)
+            try:
+                os.rename(staging, handle.path)
+            except OSError:
+                # Another process published the same name first; keep theirs.
+                shutil.rmtree(staging, ignore_errors=True)
+            return handle
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def get_or_publish(self, name: str, loader: Callable[[], Any]) -> SharedDataset:
+        """Call loader() only if the dataset has not been published yet."""
+        handle = self.get(name)
+        if handle is None:
+            handle = self.publish(name, loader())
+        return handle
+
+    def remove(self, name: str) -> None:
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def clear(self) -> None:
+        """Delete every published dataset (frees the RAM used by /dev/shm)."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+
+def _load_array(path: str, stem: str, mode: str) -> np.ndarray:
+    return np.load(os.path.join(path, f"{stem}.npy"), mmap_mode=mode)
+
+
+def _save_frame(path: str, df: pd.DataFrame) -> dict[str, Any]:
+    columns = []
+    for i, (name, col) in enumerate(df.items()):
+        stem = f"col{i}"
+        dtype = col.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            np.save(os.path.join(path, f"{stem}.npy"), col.cat.codes.to_numpy())
+            with open(os.path.join(path, f"{stem}.categories.pkl"), "wb") as f:
+                pickle.dump(col.cat.categories, f)
+            columns.append({"name": name, "stem": stem, "kind": "category", "ordered": bool(dtype.ordered)})
+        elif isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+            np.save(os.path.join(path, f"{stem}.npy"), col.to_numpy())
+            columns.append({"name": name, "stem": stem, "kind": "numpy"})
+        else:
+            # Strings and other objects cannot be memory-mapped; each worker unpickles its own copy.
+            values = col.to_numpy()
+            starts = range(0, len(values), PICKLE_CHUNK_ROWS)
+            for chunk, start in enumerate(starts):
+                with open(os.path.join(path, f"{stem}.{chunk}.pkl"), "wb") as f:
+                    pickle.dump(values[start:start + PICKLE_CHUNK_ROWS], f)
+            columns.append({"name": name, "stem": stem, "kind": "pickle", "dtype": str(dtype), "chunks": len(starts)})
+    if isinstance(df.index, pd.RangeIndex):
+        index = {"kind": "range", "start": df.index.start, "stop": df.index.stop, "step": df.index.step}
+    else:
+        with open(os.path.join(path, "index.pkl"), "wb") as f:
+            pickle.dump(df.index, f)
+        index = {"kind": "pickle"}
+    return {"kind": "frame", "length": len(df), "chunk_rows": PICKLE_CHUNK_ROWS, "columns": columns, "index": index}
+
+
+def _load_pickled_rows(path: str, stem: str, start: int, stop: int, chunk_rows: int) -> np.ndarray:
+    """Rows [start, stop) of a pickled column, reading only the chunks they fall in."""
+    first, last = start // chunk_rows, -(-stop // chunk_rows)
+    parts = []
+    for chunk in range(first, last):
+        with open(os.path.join(path, f"{stem}.{chunk}.pkl"), "rb") as f:
+            parts.append(pickle.load(f))
+    if not parts:
+        return np.empty(0, dtype=object)
+    offset = first * chunk_rows
+    return np.concatenate(parts)[start - offset:stop - offset]
+
+
+def _load_frame(path: str, manifest: dict[str, Any], mode: str, rows: slice) -> pd.DataFrame:
+    start, stop, step = rows.indices(manifest["length"])
+    if step != 1:
+        raise ValueError("rows must be a contiguous slice")
+    stop = max(stop, start)
+    data = {}
+    for col in manifest["columns"]:
+        stem = col["stem"]
+        if col["kind"] == "numpy":
+            data[col["name"]] = _load_array(path, stem, mode)[start:stop]
+        elif col["kind"] == "category":
+            with open(os.path.join(path, f"{stem}.categories.pkl"), "rb") as f:
+                categories = pickle.load(f)
+            codes = _load_array(path, stem, mode)[start:stop]
+            data[col["name"]] = pd.Categorical.from_codes(codes, categories=categories, ordered=col["ordered"])
+        else:
+            values = _load_pickled_rows(path, stem, start, stop, manifest["chunk_rows"])
+            data[col["name"]] = pd.array(values, dtype=col["dtype"])
+    index_spec = manifest["index"]
+    if index_spec["kind"] == "range":
+        index = pd.RangeIndex(index_spec["start"], index_spec["stop"], index_spec["step"])[start:stop]
+    else:
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            index = pickle.load(f)[start:stop]
+    # copy=False keeps one block per column, so each column stays a view of its memmap.
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+_default_store: SharedDatasetStore | None = None
+
+
+def default_store() -> SharedDatasetStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = SharedDatasetStore()
+    return _default_store
+
+
+def shared_seaborn_dataset(name: str, readonly: bool = False) -> pd.DataFrame:
+    """
+    Drop-in for sns.load_dataset(name): loaded once per machine, then mapped.
+    """
+    def load() -> pd.DataFrame:
+        import seaborn as sns
+        return sns.load_dataset(name)
+    return default_store().get_or_publish(f"seaborn-{name}", load).load(readonly)
+
+
+def shared_digits(readonly: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Drop-in for load_digits(return_X_y=True) that shares X and y across processes.
+    """
+    def load() -> tuple[np.ndarray, np.ndarray]:
+        from sklearn.datasets import load_digits
+        return load_digits(return_X_y=True)
+    X, y = default_store().get_or_publish("sklearn-digits", load).load(readonly)
+    return X, y
@@ -0,0 +1,197 @@
+"""
+sweep.py
+--------
+Parallel hyperparameter sweeps with cross-validation and successive halving.
+
+Generalizes the single train_test_split + fit in data_science/sklearn_intro.py:
+every (config, fold) pair is an independent task run on a process pool. The
+training arrays are published once as shared memory-mapped files
+(utils.shared_datasets), so tasks carry only indices and parameters.
+
+Successive halving: all configs start on a small training budget, and only the
+best 1/factor survive into each larger round, so hopeless configs stop early.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, clone, is_classifier
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import check_cv
+from threadpoolctl import threadpool_limits
+
+from utils.shared_datasets import SharedDataset, SharedDatasetStore
+
+
+def param_grid(grid: dict[str, Iterable[Any]]) -> list[dict[str, Any]]:
+    """Every combination of the values in grid (like sklearn's ParameterGrid)."""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(list(grid[k]) for k in keys))]
+
+
+def param_samples(distributions: dict[str, Any], n_iter: int, random_state: int | None = None) -> list[dict[str, Any]]:
+    """
+    n_iter random configs. Values are lists (sampled uniformly) or
+    scipy.stats distributions (anything with an rvs method).
+    """
+    rng = np.random.default_rng(random_state)
+    samples = []
+    for _ in range(n_iter):
+        config = {}
+        for key in sorted(distributions):
+            dist = distributions[key]
+            if hasattr(dist, "rvs"):
+                config[key] = dist.rvs(random_state=rng)
+            else:
+                values = list(dist)
+                config[key] = values[rng.integers(len(values))]
+        samples.append(config)
+    return samples
+
+
+@dataclass
+class _Task:
+    config_id: int
+    params: dict[str, Any]
+    fold: int
+    train_idx: np.ndarray
+    test_idx: np.ndarray
+    n_resources: int
+
+
+def _evaluate(data: SharedDataset, estimator: BaseEstimator, scoring: str | None, task: _Task) -> dict[str, Any]:
+    """Fit one config on one fold. Runs in a worker process on memory-mapped views."""
+    X, y = data.load(readonly=True)
+    train_idx = task.train_idx[:task.n_resources]
+    model = clone(estimator).set_params(**task.params)
+    start = time.perf_counter()
+    # One BLAS thread per worker: the pool already uses every core.
+    with threadpool_limits(1):
+        model.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    X_test, y_test = X[task.test_idx], y[task.test_idx]
+    score = get_scorer(scoring)(model, X_test, y_test) if scoring else model.score(X_test, y_test)
+    return {"config_id": task.config_id, "fold": task.fold, "score": float(score), "fit_time": fit_time}
+
+
+class Sweep:
+    """
+    Cross-validated search over a list of parameter configs.
+    Example:
+        sweep = Sweep(LogisticRegression(max_iter=200), param_grid({"C": [0.1, 1, 10]}))
+        table = sweep.run(X, y)
+    """
+    def __init__(
+        self,
+        estimator: BaseEstimator,
+        configs: list[dict[str, Any]],
+        cv: Any = 5,
+        scoring: str | None = None,
+        workers: int | None = None,
+        halving_factor: int | None = 3,
+        min_resources: int | None = None,
+        random_state: int | None = 0,
+    ) -> None:
+        if not configs:
+            raise ValueError("configs must not be empty")
+        self.estimator = estimator
+        self.configs = configs
+        self.cv = cv
+        self.scoring = scoring
+        self.workers = workers or os.cpu_count() or 1
+        self.halving_factor = halving_factor
+        self.min_resources = min_resources
+        self.random_state = random_state
+
+    def _budgets(self, n_train: int) -> list[int]:
+        """Training-set size for each halving round, ending with the full fold."""
+        factor = self.halving_factor
+        if not factor or factor < 2 or len(self.configs) == 1:
+            return [n_train]
+        n_rounds = int(np.ceil(np.log(len(self.configs)) / np.log(factor))) + 1
+        smallest = self.min_resources or max(n_train // factor ** (n_rounds - 1), 1)
+        return [min(smallest * factor ** r, n_train) for r in range(n_rounds - 1)] + [n_train]
+
+    def run(self, X: Any, y: Any, store: SharedDatasetStore | None = None) -> pd.DataFrame:
+        """
+        Evaluate all configs and return one row per (round, config), best first.
+        Columns: round, n_resources, config_id, params, mean_score, std_score, mean_fit_time.
+        """
+        X, y = np.asarray(X), np.asarray(y)
+        store = store or SharedDatasetStore()
+        # One name per run: concurrent sweeps on equal data must not remove each other's files.
+        name = f"sweep-{uuid.uuid4().hex}"
+        data = store.publish(name, (X, y))
+        rng = np.random.default_rng(self.random_state)
+        cv = check_cv(self.cv, y, classifier=is_classifier(self.estimator))
+        # Shuffle each training fold once so every budget is a random subsample.
+        folds = [(rng.permutation(train), test) for train, test in cv.split(X, y)]
+        n_train = min(len(train) for train, _ in folds)
+
+        rows = []
+        alive = list(range(len(self.configs)))
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                budgets = self._budgets(n_train)
+                for round_no, budget in enumerate(budgets):
+                    tasks = [
+                        _Task(cid, self.configs[cid], fold, train, test, budget)
+                        for cid in alive
+                        for fold, (train, test) in enumerate(folds)
+                    ]
+                    results = list(pool.map(
+                        _evaluate,
+                        itertools.repeat(data), itertools.repeat(self.estimator), itertools.repeat(self.scoring),
+                        tasks, chunksize=max(len(tasks) // (self.workers * 4), 1),
+                    ))
+                    round_rows = self._summarize(results, round_no, budget)
+                    rows.extend(round_rows)
+                    if round_no < len(budgets) - 1:
+                        keep = max(len(alive) // self.halving_factor, 1)
+                        ranked = sorted(round_rows, key=lambda r: r["mean_score"], reverse=True)
+                        alive = [r["config_id"] for r in ranked[:keep]]
+        finally:
+            store.remove(name)
+        table = pd.DataFrame(rows)
+        return table.sort_values(["round", "mean_score"], ascending=[False, False]).reset_index(drop=True)
+
+    def _summarize(self, results: list[dict[str, Any]], round_no: int, budget: int) -> list[dict[str, Any]]:
+        by_config: dict[int, list[dict[str, Any]]] = {}
+        for result in results:
+            by_config.setdefault(result["config_id"], []).append(result)
+        rows = []
+        for cid, fold_results in by_config.items():
+            scores = np.array([r["score"] for r in fold_results])
+            rows.append({
+                "round": round_no,
+                "n_resources": budget,
+                "config_id": cid,
+                "params": self.configs[cid],
+                "mean_score": scores.mean(),
+                "std_score": scores.std(),
+                "mean_fit_time": float(np.mean([r["fit_time"] for r in fold_results])),
+            })
+        return rows
+
+
+if __name__ == "__main__":
+    import warnings
+    from sklearn.datasets import load_digits
+    from sklearn.linear_model import LogisticRegression
+
+    warnings.filterwarnings("ignore")
+    X, y = load_digits(return_X_y=True)
+    configs = param_grid({"C": [0.001, 0.01, 0.1, 1.0, 10.0], "max_iter": [100, 300]})
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        table = Sweep(LogisticRegression(), configs, workers=workers).run(X, y)
+        print(f"workers={workers}: {time.perf_counter() - start:.2f}s")
+    print(table.head(10).to_string())
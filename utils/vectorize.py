@@ -0,0 +1,409 @@
+"""
+vectorize.py
+------------
+Optional accelerator that runs simple numeric comprehension/map/filter/reduce
+pipelines as NumPy array expressions.
+
+The idioms taught in basics/comprehensions.py and basics/functional_tools.py
+are recognized in the submitted code:
+    [x**2 for x in nums if x % 2 == 0]     ->  _a[_a % 2 == 0] ** 2
+    list(map(lambda x: x * 3, nums))       ->  _a * 3
+    list(filter(lambda x: x > 0, nums))    ->  _a[_a > 0]
+    reduce(lambda x, y: x * y, nums)       ->  np.prod(_a)
+    sum(x * x for x in nums)               ->  np.sum(_a * _a)
+Each one is rewritten into a call that checks its input at run time. Inputs
+that are large (min_size elements) and numeric go through NumPy; anything else
+runs the original Python code unchanged. The first NumPy run at each site is
+checked against the Python result and timed, so the run output can show
+learners the vectorized equivalent and its speedup. Every run is guarded:
+division by zero, float overflow and invalid operations fall back to Python
+(which raises where Python raises), and integer inputs are also evaluated in
+float64 so results that wrapped around int64 fall back too.
+
+    accelerator = Accelerator()
+    accelerator.run(code, namespace)
+    print(accelerator.report())
+"""
+from __future__ import annotations
+
+import array
+import ast
+import builtins
+import copy
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import numpy as np
+
+from utils.caching import memoize
+
+ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+NUMPY_CALLS = {"abs": "np.abs"}
+
+
+class _NotVectorizable(Exception):
+    pass
+
+
+class _ToNumpy(ast.NodeTransformer):
+    """Translate an element-wise expression in `var` into an array expression in `_a`."""
+    def __init__(self, var: str, free: set[str]) -> None:
+        self.var = var
+        self.free = free
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        allowed = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.BoolOp, ast.Constant,
+                   ast.Name, ast.Load, ast.Call, ast.operator, ast.unaryop, ast.cmpop, ast.boolop)
+        if not isinstance(node, allowed):
+            raise _NotVectorizable(type(node).__name__)
+        return super().generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id == self.var:
+            return ast.Name("_a", ast.Load())
+        self.free.add(node.id)
+        return node
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            raise _NotVectorizable("non-numeric constant")
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        if not isinstance(node.op, ARITHMETIC):
+            raise _NotVectorizable("operator")
+        return self.generic_visit(node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        node = self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return _np_call("logical_not", node.operand)
+        return node
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        # Truthiness, not bitwise: `x % 3 and x % 5` must not become `(x % 3) & (x % 5)`.
+        func = "logical_and" if isinstance(node.op, ast.And) else "logical_or"
+        values = [self.visit(v) for v in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = _np_call(func, result, value)
+        return result
+
+    def visit_Compare(self, node: ast.Compare) -> ast.AST:
+        # a < x < b  ->  (a < x) & (x < b)
+        left = self.visit(node.left)
+        parts = []
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.Is, ast.IsNot, ast.In, ast.NotIn)):
+                raise _NotVectorizable("comparison")
+            right = self.visit(right)
+            parts.append(ast.Compare(left, [op], [right]))
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(result, ast.BitAnd(), part)
+        return result
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not (isinstance(node.func, ast.Name) and node.func.id in NUMPY_CALLS) or node.keywords:
+            raise _NotVectorizable("call")
+        func = ast.parse(NUMPY_CALLS[node.func.id], mode="eval").body
+        return ast.Call(func, [self.visit(a) for a in node.args], [])
+
+
+def _np_call(name: str, *args: ast.AST) -> ast.AST:
+    return ast.Call(ast.Attribute(ast.Name("np", ast.Load()), name, ast.Load()), list(args), [])
+
+
+def _mask(cond: ast.AST) -> ast.AST:
+    """Boolean index for a filter condition; plain numbers (`if x % 2`) are converted to bools."""
+    if isinstance(cond, ast.Compare) or (isinstance(cond, ast.Call) and getattr(cond.func, "attr", "").startswith("logical_")):
+        return cond
+    return ast.Call(ast.Attribute(ast.Name("np", ast.Load()), "asarray", ast.Load()), [cond],
+                    [ast.keyword("dtype", ast.Name("bool", ast.Load()))])
+
+
+def _uses(node: ast.AST, name: str) -> bool:
+    return any(isinstance(n, ast.Name) and n.id == name for n in ast.walk(node))
+
+
+def _element_expr(node: ast.AST, var: str, free: set[str]) -> ast.AST:
+    return _ToNumpy(var, free).visit(ast.Expression(copy.deepcopy(node))).body
+
+
+def _is_simple_source(node: ast.AST) -> bool:
+    """Sources that are safe to evaluate twice: names, attributes and range(...)."""
+    if isinstance(node, (ast.Name, ast.Attribute)):
+        return True
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"
+            and not node.keywords and all(isinstance(a, (ast.Name, ast.Constant)) for a in node.args))
+
+
+@dataclass
+class _Site:
+    """One recognized pipeline: how to build its NumPy version and what kind of result it returns."""
+    lineno: int
+    source: str
+    numpy_expr: ast.AST
+    free: list[str]
+    source_expr: ast.AST
+    returns: str  # "list" or "scalar"
+
+    @property
+    def numpy_source(self) -> str:
+        return ast.unparse(self.numpy_expr)
+
+
+def _lambda_parts(node: ast.AST, n_args: int) -> tuple[list[str], ast.AST] | None:
+    if not isinstance(node, ast.Lambda):
+        return None
+    args = node.args
+    if args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg or args.defaults or len(args.args) != n_args:
+        return None
+    return [a.arg for a in args.args], node.body
+
+
+def _match(node: ast.AST) -> tuple[ast.AST, ast.AST, str, set[str]] | None:
+    """(numpy expression, source expression, result kind, free names) for a supported pipeline, else None."""
+    free: set[str] = set()
+
+    def comprehension(comp: ast.ListComp | ast.GeneratorExp) -> tuple[ast.AST, ast.AST]:
+        if len(comp.generators) != 1:
+            raise _NotVectorizable("nested")
+        gen = comp.generators[0]
+        if not isinstance(gen.target, ast.Name) or gen.is_async or not _is_simple_source(gen.iter):
+            raise _NotVectorizable("generator")
+        var = gen.target.id
+        if not _uses(comp.elt, var):
+            raise _NotVectorizable("constant element")
+        selected: ast.AST = ast.Name("_a", ast.Load())
+        if gen.ifs:
+            cond = ast.BoolOp(ast.And(), gen.ifs) if len(gen.ifs) > 1 else gen.ifs[0]
+            selected = ast.Subscript(selected, _mask(_element_expr(cond, var, free)), ast.Load())
+        elt = _element_expr(comp.elt, var, free)
+        elt = _Substitute(selected).visit(elt)
+        return elt, gen.iter
+
+    try:
+        if isinstance(node, ast.ListComp):
+            expr, source = comprehension(node)
+            return expr, source, "list", free
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name) or node.keywords:
+            return None
+        name, args = node.func.id, node.args
+        if name == "sum" and len(args) == 1 and isinstance(args[0], (ast.ListComp, ast.GeneratorExp)):
+            expr, source = comprehension(args[0])
+            return ast.Call(ast.parse("np.sum", mode="eval").body, [expr], []), source, "scalar", free
+        if name == "list" and len(args) == 1 and isinstance(args[0], ast.Call):
+            inner = args[0]
+            if not isinstance(inner.func, ast.Name) or inner.func.id not in ("map", "filter") or len(inner.args) != 2:
+                return None
+            parts = _lambda_parts(inner.args[0], 1)
+            if parts is None or not _is_simple_source(inner.args[1]):
+                return None
+            (var,), body = parts
+            converted = _element_expr(body, var, free)
+            if inner.func.id == "filter":
+                converted = ast.Subscript(ast.Name("_a", ast.Load()), _mask(converted), ast.Load())
+            elif not _uses(body, var):
+                return None
+            return converted, inner.args[1], "list", free
+        if name == "reduce" and len(args) == 2 and _is_simple_source(args[1]):
+            parts = _lambda_parts(args[0], 2)
+            if parts is None:
+                return None
+            (x, y), body = parts
+            reducers = {ast.Add: "np.sum", ast.Mult: "np.prod"}
+            if (isinstance(body, ast.BinOp) and type(body.op) in reducers
+                    and {getattr(body.left, "id", None), getattr(body.right, "id", None)} == {x, y}):
+                func = reducers[type(body.op)]
+            elif (isinstance(body, ast.Call) and isinstance(body.func, ast.Name) and body.func.id in ("max", "min")
+                    and {getattr(a, "id", None) for a in body.args} == {x, y} and len(body.args) == 2):
+                func = f"np.{body.func.id}"
+            else:
+                return None
+            return ast.Call(ast.parse(func, mode="eval").body, [ast.Name("_a", ast.Load())], []), args[1], "scalar", free
+    except _NotVectorizable:
+        return None
+    return None
+
+
+class _Substitute(ast.NodeTransformer):
+    """Replace `_a` with the filtered selection `_a[mask]`."""
+    def __init__(self, replacement: ast.AST) -> None:
+        self.replacement = replacement
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        return self.replacement if node.id == "_a" else node
+
+
+@memoize(maxsize=256)
+def find_sites(code: str) -> list[_Site]:
+    """All vectorizable pipelines in code, outermost first. Cached: re-running unchanged code skips the parse."""
+    sites = []
+    for node in ast.walk(ast.parse(code)):
+        matched = _match(node)
+        if matched is not None:
+            expr, source, returns, free = matched
+            free_names = sorted(n for n in free if not hasattr(builtins, n))
+            sites.append(_Site(node.lineno, ast.get_source_segment(code, node) or ast.unparse(node),
+                               expr, free_names, source, returns))
+    return sites
+
+
+@dataclass
+class Vectorization:
+    """Timing of one site: the Python version once, the NumPy version on its first large input."""
+    lineno: int
+    source: str
+    numpy_source: str
+    python_seconds: float
+    numpy_seconds: float
+    equivalent: bool
+
+    @property
+    def speedup(self) -> float:
+        return self.python_seconds / self.numpy_seconds if self.numpy_seconds else float("inf")
+
+    def __str__(self) -> str:
+        if not self.equivalent:
+            return f"line {self.lineno}: {self.source}\n    NumPy result differed (e.g. integer overflow); kept Python"
+        return (f"line {self.lineno}: {self.source}\n    NumPy: {self.numpy_source}\n"
+                f"    {self.python_seconds * 1e3:.2f} ms -> {self.numpy_seconds * 1e3:.2f} ms ({self.speedup:.1f}x faster)")
+
+
+def _as_array(value: Any) -> np.ndarray | None:
+    if isinstance(value, range):
+        return np.arange(value.start, value.stop, value.step)
+    if isinstance(value, (list, tuple, np.ndarray, array.array)):
+        arr = np.asarray(value)
+        if arr.ndim == 1 and arr.dtype.kind in "iuf":
+            return arr
+    return None
+
+
+def _same(a: Any, b: Any) -> bool:
+    try:
+        a_arr, b_arr = np.asarray(a), np.asarray(b)
+        if a_arr.shape != b_arr.shape:
+            return False
+        if a_arr.dtype.kind == "f" or b_arr.dtype.kind == "f":
+            return bool(np.allclose(a_arr, b_arr, equal_nan=True))
+        return bool(np.array_equal(a_arr, b_arr))
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+def _wrapped(numpy_func: Callable[..., Any], arr: np.ndarray, free: tuple[Any, ...], result: Any) -> bool:
+    """
+    Whether integer arithmetic wrapped around: Python ints never overflow, int64 silently
+    does. The same expression evaluated in float64 serves as a shadow; a result that
+    disagrees with it, or an integer result beyond int64, is treated as overflowed.
+    """
+    try:
+        with np.errstate(all="ignore"):
+            shadow = np.asarray(numpy_func(arr.astype(np.float64), *free))
+    except Exception:
+        return True
+    result = np.asarray(result)
+    if result.dtype.kind in "iu" and not bool(np.all(np.abs(shadow) < 2.0**63)):
+        return True
+    return not _same(result, shadow)
+
+
+class Accelerator:
+    """
+    Compiles code with vectorizable pipelines rewritten, and records their timings.
+    One Accelerator per run; read report() afterwards.
+    """
+    def __init__(self, min_size: int = 10_000) -> None:
+        self.min_size = min_size
+        self.sites: list[_Site] = []
+        self._numpy_funcs: list[Callable[..., Any]] = []
+        self._verified: dict[int, bool] = {}
+        self.results: list[Vectorization] = []
+
+    def compile(self, code: str, filename: str = "<user_code>") -> Any:
+        """Code object for code with every recognized pipeline routed through this accelerator."""
+        tree = ast.parse(code)
+        self.sites = find_sites(code)
+        for site in self.sites:
+            args = ", ".join(["_a", *site.free])
+            self._numpy_funcs.append(eval(f"lambda {args}: {site.numpy_source}", {"np": np}))
+        tree = _Rewriter(self, code).visit(tree)
+        ast.fix_missing_locations(tree)
+        # dont_inherit: keep this module's PEP 563 flag out of learner code.
+        return compile(tree, filename, "exec", dont_inherit=True)
+
+    def run(self, code: str, namespace: dict[str, Any], filename: str = "<user_code>") -> None:
+        """Compile and exec code in namespace with acceleration enabled."""
+        compiled = self.compile(code, filename)
+        namespace["__accelerator__"] = self
+        exec(compiled, namespace, namespace)
+
+    def __call__(self, site_id: int, source: Any, python: Callable[[], Any], free: tuple[Any, ...]) -> Any:
+        """Runtime entry point inserted by the rewrite."""
+        if self._verified.get(site_id) is False:
+            return python()
+        arr = _as_array(source)
+        if arr is None or len(arr) < self.min_size:
+            return python()
+        site = self.sites[site_id]
+        numpy_func = self._numpy_funcs[site_id]
+        try:
+            start = time.perf_counter()
+            # Division by zero, float overflow and invalid operations raise (or return inf)
+            # in Python; let Python produce whatever it produces.
+            with np.errstate(divide="raise", over="raise", invalid="raise", under="ignore"):
+                result = numpy_func(arr, *free)
+            numpy_seconds = time.perf_counter() - start
+        except FloatingPointError:
+            return python()
+        except Exception:
+            self._verified[site_id] = False
+            return python()
+        if arr.dtype.kind in "iu" and _wrapped(numpy_func, arr, free, result):
+            return python()
+        value = result.tolist() if site.returns == "list" else np.asarray(result).item()
+        if site_id not in self._verified:
+            start = time.perf_counter()
+            expected = python()
+            python_seconds = time.perf_counter() - start
+            ok = _same(value, expected)
+            self._verified[site_id] = ok
+            self.results.append(Vectorization(site.lineno, site.source, site.numpy_source, python_seconds, numpy_seconds, ok))
+            return value if ok else expected
+        return value
+
+    def report(self) -> str:
+        if not self.results:
+            return ""
+        return "\n".join(["--- Vectorized with NumPy ---", *map(str, self.results)])
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self, accelerator: Accelerator, code: str) -> None:
+        self.accelerator = accelerator
+        self.positions = {(s.lineno, s.source): i for i, s in enumerate(accelerator.sites)}
+        self.code = code
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if isinstance(node, (ast.ListComp, ast.Call)):
+            source = ast.get_source_segment(self.code, node)
+            site_id = self.positions.get((getattr(node, "lineno", None), source))
+            if site_id is not None:
+                site = self.accelerator.sites[site_id]
+                call = ast.Call(
+                    func=ast.Name("__accelerator__", ast.Load()),
+                    args=[
+                        ast.Constant(site_id),
+                        copy.deepcopy(site.source_expr),
+                        ast.Lambda(ast.arguments([], [], None, [], [], None, []), node),
+                        ast.Tuple([ast.Name(n, ast.Load()) for n in site.free], ast.Load()),
+                    ],
+                    keywords=[],
+                )
+                return ast.copy_location(call, node)
+        return super().visit(node)
+
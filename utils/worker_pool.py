@@ -0,0 +1,294 @@
+"""
+worker_pool.py
+--------------
+Supervised pool of code-runner processes with memory-based recycling.
+
+Long-lived workers accumulate memory from matplotlib figures, imported
+modules and pandas caches created by submitted code. WorkerPool runs each
+submission in a worker process and, after every run, looks at the RSS the
+worker reports:
+- a worker is recycled after max_runs runs, or once its RSS has grown by
+  more than max_rss_growth bytes since it became ready;
+- spare workers are spawned (and warmed up) in the background, so a
+  recycled worker is swapped for a ready spare without adding latency;
+- a run that exceeds timeout seconds kills its worker (runaway loops).
+
+    pool = WorkerPool(size=4)
+    result = pool.run(code)          # same RunResult as code_runner.run_code
+    pool.stats()                     # per-worker runs / RSS, recycle counts
+    pool.leak_report()               # with trace_leaks=True: tracemalloc diffs
+
+Select it for the app with CODE_RUNNER=pool (see code_runner.default_runner).
+"""
+from __future__ import annotations
+
+import gc
+import multiprocessing
+import os
+import pickle
+import queue
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from utils import output_capture
+from utils.code_runner import RunResult, run_code
+from utils.output_capture import BoundedOutput
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No /proc (macOS): peak RSS is the closest portable figure (bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _portable(error: Exception | None) -> Exception | None:
+    """The exception itself if it survives pickling, else a RuntimeError with the same text."""
+    if error is None:
+        return None
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def _worker_main(conn: Any, trace_leaks: bool) -> None:
+    # This process runs one submission at a time, so capturing all of fd 1 is safe here.
+    output_capture.CAPTURE_FD = True
+    # Warm up before measuring, so imports done by the runner are part of the baseline.
+    run_code("pass")
+    gc.collect()
+    baseline = None
+    if trace_leaks:
+        tracemalloc.start(25)
+        baseline = tracemalloc.take_snapshot()
+    conn.send(("ready", current_rss()))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind = message[0]
+        if kind == "run":
+            _, code, vectorize = message
+            result = run_code(code, vectorize)
+            plt = sys.modules.get("matplotlib.pyplot")
+            if plt is not None:
+                plt.close("all")
+            output = result.output
+            conn.send({
+                "stdout": result.stdout,
+                "full": output.full_output() if output is not None and output.truncated else None,
+                "total_chars": output.total_chars if output is not None else len(result.stdout),
+                "error": _portable(result.error),
+                "executed": result.executed,
+                "seconds": result.seconds,
+                "rss": current_rss(),
+            })
+            if output is not None:
+                output.close()
+        elif kind == "leaks":
+            if baseline is None:
+                conn.send(["tracemalloc is off: create the pool with trace_leaks=True"])
+                continue
+            gc.collect()
+            diff = tracemalloc.take_snapshot().compare_to(baseline, "lineno")
+            conn.send([str(stat) for stat in diff if stat.size_diff > 0][:message[1]])
+        elif kind == "stop":
+            break
+
+
+class _Worker:
+    def __init__(self, ctx: Any, trace_leaks: bool) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, trace_leaks), daemon=True, name="code-worker")
+        self.process.start()
+        child.close()
+        self.runs = 0
+        self.baseline_rss = self.rss = 0
+        self.started = time.time()
+
+    def wait_ready(self, timeout: float) -> _Worker:
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise TimeoutError("worker did not start")
+        _, self.baseline_rss = self.conn.recv()
+        self.rss = self.baseline_rss
+        return self
+
+    def call(self, message: tuple[Any, ...], timeout: float | None) -> Any:
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(("stop",))
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+    def info(self) -> dict[str, Any]:
+        return {"pid": self.process.pid, "runs": self.runs, "rss_mb": self.rss / 2**20,
+                "growth_mb": (self.rss - self.baseline_rss) / 2**20, "age_s": time.time() - self.started}
+
+
+class WorkerPool:
+    """
+    size workers serve runs; spares more are kept warm for instant replacement.
+    run() blocks while every worker is busy.
+    """
+    def __init__(
+        self,
+        size: int = 2,
+        max_runs: int = 100,
+        max_rss_growth: int = 256 * 2**20,
+        spares: int = 1,
+        timeout: float | None = 30.0,
+        trace_leaks: bool = False,
+        start_timeout: float = 60.0,
+    ) -> None:
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_growth = max_rss_growth
+        self.spares = spares
+        self.timeout = timeout
+        self.trace_leaks = trace_leaks
+        self.start_timeout = start_timeout
+        self._ctx = multiprocessing.get_context()
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._spare: queue.Queue[_Worker] = queue.Queue()
+        self._workers: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._spawner = ThreadPoolExecutor(1, thread_name_prefix="worker-spawner")
+        self.counters = {"runs": 0, "recycled_runs": 0, "recycled_rss": 0, "timeouts": 0, "crashes": 0, "cold_spawns": 0}
+        for worker in [self._new() for _ in range(size)]:
+            self._idle.put(worker.wait_ready(start_timeout))
+        for _ in range(spares):
+            self._spawner.submit(self._add_spare)
+
+    def _new(self) -> _Worker:
+        worker = _Worker(self._ctx, self.trace_leaks)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _add_spare(self) -> None:
+        self._spare.put(self._new().wait_ready(self.start_timeout))
+
+    def _retire(self, worker: _Worker, kill: bool = False) -> None:
+        with self._lock:
+            self._workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            self._spawner.submit(worker.stop)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _replace(self) -> None:
+        """Put a ready worker in the pool: a warm spare if there is one, else a cold start."""
+        try:
+            replacement = self._spare.get_nowait()
+        except queue.Empty:
+            # The spares are still starting; they stay queued, so do not schedule another.
+            self._count("cold_spawns")
+            self._idle.put(self._new().wait_ready(self.start_timeout))
+            return
+        self._idle.put(replacement)
+        self._spawner.submit(self._add_spare)
+
+    def run(self, code: str, vectorize: bool = False) -> RunResult:
+        """Run code in a worker (fresh namespace and scratch directory), like code_runner.run_code."""
+        worker = self._idle.get()
+        self._count("runs")
+        try:
+            reply = worker.call(("run", code, vectorize), self.timeout)
+        except TimeoutError:
+            self._count("timeouts")
+            self._retire(worker, kill=True)
+            self._replace()
+            return RunResult("", TimeoutError(f"Run took longer than {self.timeout:g}s and was stopped"), {})
+        except (EOFError, OSError):
+            # The worker died mid-run (segfault, os._exit, OOM killer).
+            self._count("crashes")
+            self._retire(worker, kill=True)
+            self._replace()
+            return RunResult("", RuntimeError("The worker running this code crashed"), {})
+        worker.runs += 1
+        worker.rss = reply["rss"]
+        if worker.runs >= self.max_runs:
+            self._count("recycled_runs")
+            self._retire(worker)
+            self._replace()
+        elif worker.rss - worker.baseline_rss > self.max_rss_growth:
+            self._count("recycled_rss")
+            self._retire(worker)
+            self._replace()
+        else:
+            self._idle.put(worker)
+        output = BoundedOutput()
+        output.write(reply["full"] or reply["stdout"])
+        output.total_chars = reply["total_chars"]
+        return RunResult(output.getvalue(), reply["error"], {}, reply["executed"], 0, reply["seconds"], output)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            workers = [w.info() for w in self._workers]
+            counters = dict(self.counters)
+        return {**counters, "spares_ready": self._spare.qsize(), "workers": workers}
+
+    def leak_report(self, limit: int = 10) -> str:
+        """Allocation growth since start-up, per idle worker (tracemalloc snapshot diff)."""
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        lines = []
+        try:
+            for worker in idle:
+                lines.append(f"--- worker {worker.process.pid}: {worker.runs} runs, "
+                             f"RSS +{(worker.rss - worker.baseline_rss) / 2**20:.1f} MB ---")
+                lines.extend(worker.call(("leaks", limit), self.timeout))
+        finally:
+            for worker in idle:
+                self._idle.put(worker)
+        return "\n".join(lines)
+
+    def shutdown(self) -> None:
+        self._spawner.shutdown(wait=True)
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.shutdown()